@@ -1,8 +1,8 @@
 import logging
-from pdf2zh.high_level import translate, translate_stream
+from pdf2zh.high_level import translate, translate_stream, translate_stream_to
 
 log = logging.getLogger(__name__)
 
 __version__ = "1.9.11"
 __author__ = "Byaidu"
-__all__ = ["translate", "translate_stream"]
+__all__ = ["translate", "translate_stream", "translate_stream_to"]
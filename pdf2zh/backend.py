@@ -1,11 +1,16 @@
 from flask import Flask, request, send_file, jsonify
 from celery import Celery, Task
 from celery.result import AsyncResult
-from pdf2zh import translate_stream
+from pdf2zh import translate_stream, translate_stream_to
+from pdf2zh.high_level import OUTPUTS
+from pdf2zh.cache import checkpoint_path
 import tqdm
 import json
+import hashlib
 import io
 import os
+import shutil
+from pathlib import Path
 from pdf2zh.doclayout import ModelInstance
 from pdf2zh.config import ConfigManager
 from werkzeug.exceptions import RequestEntityTooLarge
@@ -38,6 +43,14 @@ worker_concurrency = int(os.environ.get("CELERY_WORKER_CONCURRENCY", "2"))
 TASK_SOFT_TIME_LIMIT = int(os.environ.get("CELERY_TASK_SOFT_TIME_LIMIT", "1800"))  # 30分（デフォルト）
 TASK_TIME_LIMIT = int(os.environ.get("CELERY_TASK_TIME_LIMIT", "2100"))  # 35分（デフォルト、soft_time_limitより長く設定）
 
+# 翻訳結果の保存先ディレクトリ（APIサーバーとワーカーで共有されている必要がある）
+# 設定するとワーカーはPDFを直接ファイルに書き出し、結果バックエンドにはパスのみを保存する
+# 未設定の場合は従来通りPDFのバイト列を結果バックエンド経由で返す
+RESULT_DIR = os.environ.get("PDF2ZH_RESULT_DIR")
+
+# 1 に設定すると完了済みページを記録し、ワーカー再起動後の再実行で再利用する（オプトイン）
+CHECKPOINT = os.environ.get("PDF2ZH_CHECKPOINT") == "1"
+
 # Redis接続URLの構築
 # RailwayではREDISHOST環境変数が自動的に設定される場合がある
 def get_redis_url():
@@ -246,13 +259,36 @@ def translate_task(
     except Exception as e:
         print(f"WARNING [Celery Worker]: Could not monitor memory: {e}")
 
+    # 同じ入力と引数での再実行時に完了済みページを再利用するチェックポイント
+    # ファイルはロックされるため、同一内容のタスクが同時に走ると後のタスクはチェックポイントなしで続行する
+    if CHECKPOINT:
+        checkpoint_key = hashlib.sha256(stream)
+        checkpoint_key.update(json.dumps(args, sort_keys=True).encode())
+        args = {**args, "checkpoint": checkpoint_path(checkpoint_key.hexdigest())}
+
     try:
-        doc_mono, doc_dual = translate_stream(
-            stream,
-            callback=progress_bar,
-            model=ModelInstance.value,
-            **args,
-        )
+        if RESULT_DIR:
+            # PyMuPDFから共有ディレクトリへ直接保存し、パスのみを返す
+            outputs = args.get("outputs", "both")
+            task_dir = Path(RESULT_DIR) / self.request.id
+            task_dir.mkdir(parents=True, exist_ok=True)
+            doc_mono = str(task_dir / "mono.pdf") if outputs != "dual" else None
+            doc_dual = str(task_dir / "dual.pdf") if outputs != "mono" else None
+            translate_stream_to(
+                stream,
+                mono=doc_mono,
+                dual=doc_dual,
+                callback=progress_bar,
+                model=ModelInstance.value,
+                **args,
+            )
+        else:
+            doc_mono, doc_dual = translate_stream(
+                stream,
+                callback=progress_bar,
+                model=ModelInstance.value,
+                **args,
+            )
         
         # メモリ使用量を確認（オプション）
         try:
@@ -326,6 +362,12 @@ def create_translate_tasks():
             return {"status": "error", "code": 400, "message": f"Invalid JSON: {str(e)}"}, 400
         
         print(f"DEBUG [Backend]: Translation args: {args}")
+
+        # 出力形式の確認（mono / dual / both）
+        outputs = args.get("outputs", "both")
+        if outputs not in OUTPUTS:
+            print(f"ERROR [Backend]: Invalid outputs: {outputs}")
+            return {"status": "error", "code": 400, "message": f"Invalid outputs. Must be one of {', '.join(OUTPUTS)}"}, 400
         
         # Celeryワーカーの確認
         try:
@@ -422,6 +464,8 @@ def get_translate_task(id: str):
 def delete_translate_task(id: str):
     result: AsyncResult = celery_app.AsyncResult(id)
     result.revoke(terminate=True)
+    if RESULT_DIR:
+        shutil.rmtree(Path(RESULT_DIR) / id, ignore_errors=True)
     return {"state": str(result.state)}
 
 
@@ -452,6 +496,12 @@ def get_translate_result(id: str, format: str):
         
         doc_mono, doc_dual = result.get()
         to_send = doc_mono if format == "mono" else doc_dual
+        if to_send is None:
+            # タスク作成時の outputs で生成されなかった形式
+            return {"status": "error", "code": 404, "message": f"Format '{format}' was not generated for this task"}, 404
+        if isinstance(to_send, str):
+            # PDF2ZH_RESULT_DIR 使用時はファイルパスが返される
+            return send_file(to_send, "application/pdf")
         return send_file(io.BytesIO(to_send), "application/pdf")
     except Exception as e:
         print(f"ERROR [Backend]: Error getting translation result: {e}")
@@ -0,0 +1,137 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from pdf2zh.translator import BaseTranslator
+
+logger = logging.getLogger(__name__)
+
+
+class Endpoint:
+    """Routing state of one member translator"""
+
+    def __init__(self, translator: BaseTranslator):
+        self.translator = translator
+        self.outstanding = 0  # 进行中的请求数
+        self.latency = 0.0  # 成功请求耗时的 EWMA（秒）
+        self.failures = 0  # 连续失败次数
+        self.open_until = 0.0  # 熔断到期时间，到期后放行一个请求试探（半开）
+        self.probing = False  # 半开状态下的试探请求是否进行中
+
+    def __str__(self):
+        return str(self.translator)
+
+    def available(self, now: float) -> bool:
+        if not self.open_until:
+            return True
+        # 熔断期间不可用；半开时只放行一个试探请求，试探成功后才恢复
+        return self.open_until <= now and not self.probing
+
+
+class BalancedTranslator(BaseTranslator):
+    """
+    Spread requests over several translators of different endpoints or services.
+    Each request goes to the healthy member with the fewest outstanding requests,
+    ties broken by latency EWMA. A member failing repeatedly is ejected for a while
+    by a circuit breaker, and failed requests are retried on the other members.
+    After the cooldown a single trial request is sent to the ejected member, which
+    only comes back once that request succeeds.
+    The members translate, cache and rate limit the requests themselves.
+    """
+
+    name = "balanced"
+    alpha = 0.3  # EWMA 平滑系数
+    failure_threshold = 3  # 连续失败多少次后熔断
+    cooldown = 30  # 熔断时长（秒）
+
+    def __init__(self, translators: list[BaseTranslator]):
+        # 不调用 BaseTranslator.__init__，缓存、限流和对冲都由成员各自负责
+        first = translators[0]
+        # 语言代码以第一个成员映射后的结果为准
+        self.lang_in = first.lang_in
+        self.lang_out = first.lang_out
+        self.model = ",".join(f"{t.name}:{t.model}" for t in translators)
+        self.ignore_cache = first.ignore_cache
+        self.endpoints = [Endpoint(t) for t in translators]
+        self.lock = threading.Lock()
+
+    def cache_params(self) -> dict:
+        return {
+            "translate_engine": self.name,
+            "translate_engine_params": json.dumps(
+                [e.translator.cache_params() for e in self.endpoints]
+            ),
+        }
+
+    def pick(self, tried: list[Endpoint]) -> Endpoint | None:
+        """Return the member for the next attempt, None if all untried ones are ejected"""
+        with self.lock:
+            now = time.monotonic()
+            available = [
+                e for e in self.endpoints if e not in tried and e.available(now)
+            ]
+            if not available:
+                return None
+            endpoint = min(available, key=lambda e: (e.outstanding, e.latency))
+            if endpoint.open_until:
+                endpoint.probing = True
+            endpoint.outstanding += 1
+            return endpoint
+
+    def done(
+        self,
+        endpoint: Endpoint,
+        start: float,
+        error: BaseException = None,
+        trial: bool = False,
+    ):
+        with self.lock:
+            endpoint.outstanding -= 1
+            if trial:
+                endpoint.probing = False
+            if error is not None and not isinstance(error, Exception):
+                return  # 被取消，不计入统计，下一个请求重新试探
+            if error is None:
+                elapsed = time.monotonic() - start
+                if endpoint.latency:
+                    endpoint.latency += self.alpha * (elapsed - endpoint.latency)
+                else:
+                    endpoint.latency = elapsed
+                endpoint.failures = 0
+                endpoint.open_until = 0.0
+                return
+            endpoint.failures += 1
+            if endpoint.failures >= self.failure_threshold:
+                endpoint.open_until = time.monotonic() + self.cooldown
+                logger.warning(
+                    f"{endpoint} failed {endpoint.failures} times, "
+                    f"ejected for {self.cooldown} seconds: {error!r}"
+                )
+
+    async def atranslate(self, text: str, ignore_cache: bool = False) -> str:
+        tried = []
+        error = None
+        deadline = time.monotonic() + self.cooldown
+        while True:
+            endpoint = self.pick(tried)
+            if endpoint is None:  # 其余成员都在熔断中，等待冷却结束或试探成功
+                if time.monotonic() > deadline:
+                    raise error or RuntimeError(f"All members of {self} are ejected")
+                await asyncio.sleep(0.1)
+                continue
+            trial = endpoint.probing
+            tried.append(endpoint)
+            start = time.monotonic()
+            try:
+                result = await endpoint.translator.atranslate(text, ignore_cache)
+            except BaseException as e:
+                self.done(endpoint, start, e, trial)
+                if not isinstance(e, Exception) or len(tried) == len(self.endpoints):
+                    raise
+                error = e
+                logger.warning(f"{endpoint} failed, trying another one: {e!r}")
+                continue
+            self.done(endpoint, start, trial=trial)
+            return result
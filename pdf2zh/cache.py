@@ -1,7 +1,16 @@
 import logging
 import os
 import json
-from peewee import Model, SqliteDatabase, AutoField, CharField, TextField, SQL
+import zlib
+from peewee import (
+    Model,
+    SqliteDatabase,
+    AutoField,
+    BlobField,
+    CharField,
+    TextField,
+    SQL,
+)
 from typing import Optional
 
 
@@ -33,6 +42,27 @@ class _TranslationCache(Model):
         ]
 
 
+class _PageCache(Model):
+    id = AutoField()
+    digest = CharField(max_length=64)
+    params = TextField()
+    patch = BlobField()  # zlib 压缩的 JSON
+
+    class Meta:
+        database = db
+        constraints = [
+            SQL(
+                """
+            UNIQUE (
+                digest,
+                params
+                )
+            ON CONFLICT REPLACE
+            """
+            )
+        ]
+
+
 class TranslationCache:
     @staticmethod
     def _sort_dict_recursively(obj):
@@ -95,11 +125,169 @@ class TranslationCache:
             logger.debug(f"Error setting cache: {e}")
 
 
+def _dump_patch(patch: dict) -> dict:
+    return {
+        "page": patch["page"].decode("latin-1"),
+        "forms": {k: v.decode("latin-1") for k, v in patch["forms"].items()},
+    }
+
+
+def _load_patch(patch: dict) -> dict:
+    return {
+        "page": patch["page"].encode("latin-1"),
+        "forms": {k: v.encode("latin-1") for k, v in patch["forms"].items()},
+    }
+
+
+class PageCache:
+    """Typeset patches of whole pages, keyed by the page content digest.
+
+    A patch is ``{"page": bytes, "forms": {form digest: bytes}}``; the
+    form streams are keyed by digest because object ids change whenever
+    the document is re-saved. Only the latest ``max_entries`` pages are
+    kept, older entries are evicted as new ones are written.
+    """
+
+    def __init__(self, params: dict, max_entries: int = 2000):
+        self.params = json.dumps(TranslationCache._sort_dict_recursively(params))
+        self.max_entries = max_entries
+
+    def get(self, digest: str) -> Optional[dict]:
+        result = _PageCache.get_or_none(digest=digest, params=self.params)
+        if result is None:
+            return None
+        try:
+            return _load_patch(json.loads(zlib.decompress(result.patch)))
+        except (zlib.error, TypeError, ValueError):  # 旧格式的记录
+            return None
+
+    def set(self, digest: str, patch: dict):
+        try:
+            entry = _PageCache.create(
+                digest=digest,
+                params=self.params,
+                patch=zlib.compress(json.dumps(_dump_patch(patch)).encode()),
+            )
+            # REPLACE 会分配新的 id，按 id 删除最早写入的记录
+            _PageCache.delete().where(
+                _PageCache.id <= entry.id - self.max_entries
+            ).execute()
+        except Exception as e:
+            logger.debug(f"Error setting page cache: {e}")
+
+
+class PageCheckpoint:
+    """Page patches of an unfinished run, appended to a JSON lines file.
+
+    The first line records the params; a checkpoint written with other
+    params is discarded. Entries are appended as pages complete so that an
+    interrupted run can be resumed. The file is locked while in use; when
+    another run holds it, this run goes on without a checkpoint. Without a
+    path nothing is recorded.
+    """
+
+    def __init__(self, path: Optional[str], params: dict):
+        self.path = path
+        self.params = json.dumps(TranslationCache._sort_dict_recursively(params))
+        self.pages = {}
+        self.file = None
+        if path is None:
+            return
+        self.file = open(path, "a+", encoding="utf-8")
+        self.file.seek(0)  # 各进程锁定同一位置
+        if not lock_file(self.file):
+            logger.warning(f"Checkpoint {path} is in use, running without it")
+            self.file.close()
+            self.file = None
+            return
+        lines = self.file.read().splitlines()
+        try:
+            if lines and json.loads(lines[0]).get("params") == self.params:
+                for line in lines[1:]:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:  # 中断时最后一行可能没写完
+                        continue
+                    self.pages[entry.pop("digest")] = entry
+        except ValueError:
+            pass
+        # 只保留有效的记录，重新写出文件后再逐页追加
+        self.file.seek(0)
+        self.file.truncate()
+        self.file.write(json.dumps({"params": self.params}) + "\n")
+        for digest, entry in self.pages.items():
+            self.file.write(json.dumps({"digest": digest, **entry}) + "\n")
+        self.file.flush()
+
+    def get(self, digest: str) -> Optional[dict]:
+        entry = self.pages.get(digest)
+        return _load_patch(entry) if entry else None
+
+    def set(self, digest: str, patch: dict):
+        if self.file is None:
+            return
+        entry = _dump_patch(patch)
+        self.pages[digest] = entry
+        self.file.write(json.dumps({"digest": digest, **entry}) + "\n")
+        self.file.flush()
+
+    def close(self):
+        """Release the lock, the file is kept for resuming"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def lock_file(f) -> bool:
+    """Take a non-blocking exclusive lock on an open file, released when it is closed"""
+    try:
+        if os.name == "nt":
+            import msvcrt
+
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+def remove_checkpoint(path: str):
+    """Remove the checkpoint of a finished run, unless another run is using it"""
+    try:
+        with open(path, "a") as f:
+            f.seek(0)
+            if not lock_file(f):
+                return
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def cache_folder() -> str:
+    return os.path.join(os.path.expanduser("~"), ".cache", "pdf2zh")
+
+
+def checkpoint_path(key: str) -> str:
+    """Checkpoint file of a run identified by key, under the cache folder"""
+    folder = os.path.join(cache_folder(), "checkpoints")
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f"{key}.jsonl")
+
+
 def init_db(remove_exists=False):
-    cache_folder = os.path.join(os.path.expanduser("~"), ".cache", "pdf2zh")
-    os.makedirs(cache_folder, exist_ok=True)
+    folder = cache_folder()
+    os.makedirs(folder, exist_ok=True)
     # The current version does not support database migration, so add the version number to the file name.
-    cache_db_path = os.path.join(cache_folder, "cache.v1.db")
+    cache_db_path = os.path.join(folder, "cache.v1.db")
     if remove_exists and os.path.exists(cache_db_path):
         os.remove(cache_db_path)
     db.init(
@@ -109,7 +297,7 @@ def init_db(remove_exists=False):
             "busy_timeout": 1000,
         },
     )
-    db.create_tables([_TranslationCache], safe=True)
+    db.create_tables([_TranslationCache, _PageCache], safe=True)
 
 
 def init_test_db():
@@ -123,14 +311,14 @@ def init_test_db():
             "busy_timeout": 1000,
         },
     )
-    test_db.bind([_TranslationCache], bind_refs=False, bind_backrefs=False)
+    test_db.bind([_TranslationCache, _PageCache], bind_refs=False, bind_backrefs=False)
     test_db.connect()
-    test_db.create_tables([_TranslationCache], safe=True)
+    test_db.create_tables([_TranslationCache, _PageCache], safe=True)
     return test_db
 
 
 def clean_test_db(test_db):
-    test_db.drop_tables([_TranslationCache])
+    test_db.drop_tables([_TranslationCache, _PageCache])
     test_db.close()
     db_path = test_db.database
     if os.path.exists(db_path):
@@ -1,8 +1,12 @@
+import asyncio
 import concurrent.futures
 import logging
 import re
+import threading
 import unicodedata
+from asyncio import CancelledError
 from enum import Enum
+from itertools import chain
 from string import Template
 from typing import Dict
 
@@ -13,37 +17,95 @@ from pdfminer.pdffont import PDFCIDFont, PDFUnicodeNotDefined
 from pdfminer.pdfinterp import PDFGraphicState, PDFResourceManager
 from pdfminer.utils import apply_matrix_pt, mult_matrix
 from pymupdf import Font
-from tenacity import retry, wait_fixed
-
-from pdf2zh.translator import (
-    AnythingLLMTranslator,
-    ArgosTranslator,
-    AzureOpenAITranslator,
-    AzureTranslator,
-    BaseTranslator,
-    BingTranslator,
-    DeepLTranslator,
-    DeepLXTranslator,
-    DeepseekTranslator,
-    DifyTranslator,
-    GeminiTranslator,
-    GoogleTranslator,
-    GrokTranslator,
-    GroqTranslator,
-    ModelScopeTranslator,
-    OllamaTranslator,
-    OpenAIlikedTranslator,
-    OpenAITranslator,
-    QwenMtTranslator,
-    SiliconTranslator,
-    TencentTranslator,
-    XinferenceTranslator,
-    ZhipuTranslator,
-    X302AITranslator,
-)
+from tenacity import retry, stop_after_attempt, wait_fixed
+
+from pdf2zh.registry import get_translator
+from pdf2zh.translator import BaseTranslator, submit_async
 
 log = logging.getLogger(__name__)
 
+# PyMuPDF 不支持多线程，同时翻译多个文档时所有 PyMuPDF 调用都需持有此锁
+mupdf_lock = threading.RLock()
+
+FORMULA_PLACEHOLDER = re.compile(r"\{\s*v([\d\s]+)\}", re.IGNORECASE)  # 匹配 {vn} 公式标记
+
+
+HEX2 = [b"%02x" % i for i in range(256)]  # 单字节十六进制编码表
+
+
+def hex_code(code: int, cid: bool) -> bytes:
+    # 查表编码单个字符，CID 字体使用双字节
+    if cid:
+        if code < 0x10000:
+            return HEX2[code >> 8] + HEX2[code & 0xFF]
+        return b"%04x" % code
+    if code < 0x100:
+        return HEX2[code]
+    return b"%02x" % code
+
+
+def fmt_num(v: float) -> bytes:
+    # 输出紧凑的数字，保留 4 位小数
+    s = (b"%.4f" % v).rstrip(b"0").rstrip(b".")
+    return b"0" if s == b"-0" else s
+
+
+class ContentWriter:
+    """Byte-oriented builder for the generated text operators.
+
+    Font selections are only emitted when they change and glyph runs are
+    placed with ``Td`` moves relative to the previous run.
+    """
+
+    def __init__(self) -> None:
+        self.buf = bytearray(b"BT ")
+        self.font: tuple[str, float] = None  # 当前字体和字号
+        self.tx: float = 0  # 当前行起点横坐标
+        self.ty: float = 0  # 当前行起点纵坐标
+
+    def text(self, font: str, size: float, x: float, y: float, rtxt: bytes) -> None:
+        if self.font != (font, size):
+            self.buf += b"/%s %s Tf " % (font.encode(), fmt_num(size))
+            self.font = (font, size)
+        dx = round(x - self.tx, 4)
+        dy = round(y - self.ty, 4)
+        self.buf += b"%s %s Td [<%s>] TJ " % (fmt_num(dx), fmt_num(dy), rtxt)
+        self.tx += dx
+        self.ty += dy
+
+    def line(self, x: float, y: float, xlen: float, ylen: float, linewidth: float) -> None:
+        self.buf += b"ET q 1 0 0 1 %s %s cm [] 0 d 0 J %s w 0 0 m %s %s l S Q BT " % (
+            fmt_num(x),
+            fmt_num(y),
+            fmt_num(linewidth),
+            fmt_num(xlen),
+            fmt_num(ylen),
+        )
+        self.tx = self.ty = 0  # BT 会重置文本矩阵，q/Q 保留字体状态
+
+    def getvalue(self) -> bytes:
+        return bytes(self.buf + b"ET ")
+
+
+def split_formula(text: str) -> list[tuple[str, int | None]]:
+    """Split translated text into (text run, formula id) segments in one pass.
+
+    The formula id is None for the trailing run and for placeholders whose
+    id cannot be parsed.
+    """
+    segments = []
+    pos = 0
+    for m in FORMULA_PLACEHOLDER.finditer(text):
+        try:
+            vid = int(m.group(1).replace(" ", ""))
+        except ValueError:
+            vid = None
+        segments.append((text[pos:m.start()], vid))
+        pos = m.end()
+    if pos < len(text):
+        segments.append((text[pos:], None))
+    return segments
+
 
 class PDFConverterEx(PDFConverter):
     def __init__(
@@ -62,7 +124,9 @@ class PDFConverterEx(PDFConverter):
 
     def end_page(self, page):
         # 重载返回指令流
-        return self.receive_layout(self.cur_item)
+        ops = self.receive_layout(self.cur_item)
+        self.cur_item = None  # 排版完成后释放整页 LTChar
+        return ops
 
     def begin_figure(self, name, bbox, matrix) -> None:
         # 重载设置 pageid
@@ -73,9 +137,8 @@ class PDFConverterEx(PDFConverter):
     def end_figure(self, _: str) -> None:
         # 重载返回指令流
         fig = self.cur_item
-        assert isinstance(self.cur_item, LTFigure), str(type(self.cur_item))
         self.cur_item = self._stack.pop()
-        self.cur_item.add(fig)
+        # fig 已经在这里排版，不再挂到上层容器，避免 LTChar 保留到页面结束
         return self.receive_layout(fig)
 
     def render_char(
@@ -115,7 +178,14 @@ class PDFConverterEx(PDFConverter):
         return item.adv
 
 
+class OpType(Enum):
+    TEXT = "text"
+    LINE = "line"
+
+
 class Paragraph:
+    __slots__ = ("y", "x", "x0", "x1", "y0", "y1", "size", "brk")
+
     def __init__(self, y, x, x0, x1, y0, y1, size, brk):
         self.y: float = y  # 初始纵坐标
         self.x: float = x  # 初始横坐标
@@ -127,7 +197,232 @@ class Paragraph:
         self.brk: bool = brk  # 换行标记
 
 
+class VarChar:
+    # 公式字符，只保留排版需要的字段，解析完成后释放 LTChar
+    __slots__ = ("x0", "x1", "y0", "size", "width", "cid", "font", "text")
+
+    def __init__(self, ch: LTChar):
+        self.x0: float = ch.x0  # 左边界
+        self.x1: float = ch.x1  # 右边界
+        self.y0: float = ch.y0  # 下边界
+        self.size: float = ch.size  # 字体大小
+        self.width: float = ch.width  # 字符宽度
+        self.cid: int = ch.cid  # 原字符编码
+        self.font = ch.font  # 原字符字体
+        self.text: str = ch.get_text()  # 原字符文本
+
+
+class TextOp:
+    # 待输出的文字指令
+    __slots__ = ("font", "size", "x", "dy", "rtxt", "lidx")
+    type = OpType.TEXT
+
+    def __init__(self, font, size, x, dy, rtxt, lidx):
+        self.font: str = font  # 字体 ID
+        self.size: float = size  # 字体大小
+        self.x: float = x  # 横坐标
+        self.dy: float = dy  # 相对段落的纵向偏移
+        self.rtxt: bytes = rtxt  # 编码后的文字
+        self.lidx: int = lidx  # 所在行号
+
+
+class LineOp:
+    # 待输出的线条指令
+    __slots__ = ("x", "dy", "xlen", "ylen", "linewidth", "lidx")
+    type = OpType.LINE
+
+    def __init__(self, x, dy, xlen, ylen, linewidth, lidx):
+        self.x: float = x  # 横坐标
+        self.dy: float = dy  # 相对段落的纵向偏移
+        self.xlen: float = xlen  # 横向长度
+        self.ylen: float = ylen  # 纵向长度
+        self.linewidth: float = linewidth  # 线宽
+        self.lidx: int = lidx  # 所在行号
+
+
 # fmt: off
+class Glyph:
+    # 流式解析时代替 LTChar 的轻量字符，只保留 receive_layout 读取的字段
+    __slots__ = ("x0", "x1", "y0", "y1", "width", "size", "adv", "matrix", "fontname", "text", "cid", "font")
+
+    def __init__(self, matrix, font, fontsize, scaling, rise, text, textwidth, textdisp, cid):
+        # 边界计算与 LTChar 保持一致
+        self.adv = textwidth * fontsize * scaling
+        if font.is_vertical():
+            (vx, vy) = textdisp
+            if vx is None:
+                vx = fontsize * 0.5
+            else:
+                vx = vx * fontsize * 0.001
+            vy = (1000 - vy) * fontsize * 0.001
+            bbox_lower_left = (-vx, vy + rise + self.adv)
+            bbox_upper_right = (-vx + fontsize, vy + rise)
+        else:
+            descent = font.get_descent() * fontsize
+            bbox_lower_left = (0, descent + rise)
+            bbox_upper_right = (self.adv, descent + rise + fontsize)
+        (x0, y0) = apply_matrix_pt(matrix, bbox_lower_left)
+        (x1, y1) = apply_matrix_pt(matrix, bbox_upper_right)
+        if x1 < x0:
+            (x0, x1) = (x1, x0)
+        if y1 < y0:
+            (y0, y1) = (y1, y0)
+        self.x0, self.y0, self.x1, self.y1 = x0, y0, x1, y1
+        self.width = x1 - x0
+        self.size = self.width if font.is_vertical() else y1 - y0
+        self.matrix = matrix
+        self.fontname = font.fontname
+        self.text = text
+        self.cid = cid
+        self.font = font
+
+    def get_text(self) -> str:
+        return self.text
+
+
+class LayoutParser:
+    # 段落和公式的解析状态机，可以遍历 LTPage 喂入，也可以在渲染字符时流式喂入
+    def __init__(self, converter: "TranslateConverter", pageid: int, width: float):
+        self.converter = converter
+        self.pageid = pageid
+        # 段落
+        self.sstk: list[str] = []          # 段落文字栈
+        self.pstk: list[Paragraph] = []    # 段落属性栈
+        self.vbkt: int = 0                 # 段落公式括号计数
+        # 公式组
+        self.vstk: list[VarChar] = []    # 公式符号组
+        self.vlstk: list[LTLine] = []    # 公式线条组
+        self.vfix: float = 0             # 公式纵向偏移
+        # 公式组栈
+        self.var: list[list[VarChar]] = []    # 公式符号组栈
+        self.varl: list[list[LTLine]] = []    # 公式线条组栈
+        self.varf: list[float] = []           # 公式纵向偏移栈
+        self.vlen: list[float] = []           # 公式宽度栈
+        # 全局
+        self.lstk: list[LTLine] = []    # 全局线条栈
+        self.xt: LTChar = None          # 上一个字符
+        self.xt_cls: int = -1           # 上一个字符所属段落，保证无论第一个字符属于哪个类别都可以触发新段落
+        self.vmax: float = width / 4    # 行内公式最大宽度
+
+    def add(self, child):
+        if isinstance(child, (LTChar, Glyph)):
+            cur_v = False
+            layout = self.converter.layout[self.pageid]
+            # ltpage.height 可能是 fig 里面的高度，这里统一用 layout.shape
+            h, w = layout.shape
+            # 读取当前字符在 layout 中的类别
+            cx, cy = np.clip(int(child.x0), 0, w - 1), np.clip(int(child.y0), 0, h - 1)
+            cls = layout[cy, cx]
+            # 锚定文档中 bullet 的位置
+            if child.get_text() == "•":
+                cls = 0
+            # 判定当前字符是否属于公式
+            if (                                                                                                         # 判定当前字符是否属于公式
+                cls == 0                                                                                                 # 1. 类别为保留区域
+                or (cls == self.xt_cls and len(self.sstk[-1].strip()) > 1 and child.size < self.pstk[-1].size * 0.79)    # 2. 角标字体，有 0.76 的角标和 0.799 的大写，这里用 0.79 取中，同时考虑首字母放大的情况
+                or self.converter.vflag(child.fontname, child.get_text())                                                # 3. 公式字体
+                or (child.matrix[0] == 0 and child.matrix[3] == 0)                                                       # 4. 垂直字体
+            ):
+                cur_v = True
+            # 判定括号组是否属于公式
+            if not cur_v:
+                if self.vstk and child.get_text() == "(":
+                    cur_v = True
+                    self.vbkt += 1
+                if self.vbkt and child.get_text() == ")":
+                    cur_v = True
+                    self.vbkt -= 1
+            if (                                                                       # 判定当前公式是否结束
+                not cur_v                                                              # 1. 当前字符不属于公式
+                or cls != self.xt_cls                                                  # 2. 当前字符与前一个字符不属于同一段落
+                # or (abs(child.x0 - xt.x0) > vmax and cls != 0)                       # 3. 段落内换行，可能是一长串斜体的段落，也可能是段内分式换行，这里设个阈值进行区分
+                # 禁止纯公式（代码）段落换行，直到文字开始再重开文字段落，保证只存在两种情况
+                # A. 纯公式（代码）段落（锚定绝对位置）sstk[-1]=="" -> sstk[-1]=="{v*}"
+                # B. 文字开头段落（排版相对位置）sstk[-1]!=""
+                or (self.sstk[-1] != "" and abs(child.x0 - self.xt.x0) > self.vmax)    # 因为 cls==xt_cls==0 一定有 sstk[-1]==""，所以这里不需要再判定 cls!=0
+            ):
+                if self.vstk:
+                    if (                                                     # 根据公式右侧的文字修正公式的纵向偏移
+                        not cur_v                                            # 1. 当前字符不属于公式
+                        and cls == self.xt_cls                               # 2. 当前字符与前一个字符属于同一段落
+                        and child.x0 > max([vch.x0 for vch in self.vstk])    # 3. 当前字符在公式右侧
+                    ):
+                        self.vfix = self.vstk[0].y0 - child.y0
+                    if self.sstk[-1] == "":
+                        self.xt_cls = -1  # 禁止纯公式段落（sstk[-1]=="{v*}"）的后续连接，但是要考虑新字符和后续字符的连接，所以这里修改的是上个字符的类别
+                    self.sstk[-1] += f"{{v{len(self.var)}}}"
+                    self.var.append(self.vstk)
+                    self.varl.append(self.vlstk)
+                    self.varf.append(self.vfix)
+                    self.vstk = []
+                    self.vlstk = []
+                    self.vfix = 0
+            # 当前字符不属于公式或当前字符是公式的第一个字符
+            if not self.vstk:
+                if cls == self.xt_cls:               # 当前字符与前一个字符属于同一段落
+                    if child.x0 > self.xt.x1 + 1:    # 添加行内空格
+                        self.sstk[-1] += " "
+                    elif child.x1 < self.xt.x0:      # 添加换行空格并标记原文段落存在换行
+                        self.sstk[-1] += " "
+                        self.pstk[-1].brk = True
+                else:                                # 根据当前字符构建一个新的段落
+                    self.sstk.append("")
+                    self.pstk.append(Paragraph(child.y0, child.x0, child.x0, child.x0, child.y0, child.y1, child.size, False))
+            if not cur_v:                                                 # 文字入栈
+                if (                                                      # 根据当前字符修正段落属性
+                    child.size > self.pstk[-1].size                       # 1. 当前字符比段落字体大
+                    or len(self.sstk[-1].strip()) == 1                    # 2. 当前字符为段落第二个文字（考虑首字母放大的情况）
+                ) and child.get_text() != " ":                            # 3. 当前字符不是空格
+                    self.pstk[-1].y -= child.size - self.pstk[-1].size    # 修正段落初始纵坐标，假设两个不同大小字符的上边界对齐
+                    self.pstk[-1].size = child.size
+                self.sstk[-1] += child.get_text()
+            else:                                # 公式入栈
+                if (                             # 根据公式左侧的文字修正公式的纵向偏移
+                    not self.vstk                # 1. 当前字符是公式的第一个字符
+                    and cls == self.xt_cls       # 2. 当前字符与前一个字符属于同一段落
+                    and child.x0 > self.xt.x0    # 3. 前一个字符在公式左侧
+                ):
+                    self.vfix = child.y0 - self.xt.y0
+                self.vstk.append(VarChar(child))
+            # 更新段落边界，因为段落内换行之后可能是公式开头，所以要在外边处理
+            self.pstk[-1].x0 = min(self.pstk[-1].x0, child.x0)
+            self.pstk[-1].x1 = max(self.pstk[-1].x1, child.x1)
+            self.pstk[-1].y0 = min(self.pstk[-1].y0, child.y0)
+            self.pstk[-1].y1 = max(self.pstk[-1].y1, child.y1)
+            # 更新上一个字符
+            self.xt = child
+            self.xt_cls = cls
+        elif isinstance(child, LTFigure):   # 图表
+            pass
+        elif isinstance(child, LTLine):     # 线条
+            layout = self.converter.layout[self.pageid]
+            # ltpage.height 可能是 fig 里面的高度，这里统一用 layout.shape
+            h, w = layout.shape
+            # 读取当前线条在 layout 中的类别
+            cx, cy = np.clip(int(child.x0), 0, w - 1), np.clip(int(child.y0), 0, h - 1)
+            cls = layout[cy, cx]
+            if self.vstk and cls == self.xt_cls:    # 公式线条
+                self.vlstk.append(child)
+            else:                                   # 全局线条
+                self.lstk.append(child)
+        else:
+            pass
+
+    def finish(self):
+        # 处理结尾
+        if self.vstk:    # 公式出栈
+            self.sstk[-1] += f"{{v{len(self.var)}}}"
+            self.var.append(self.vstk)
+            self.varl.append(self.vlstk)
+            self.varf.append(self.vfix)
+        log.debug("\n==========[VSTACK]==========\n")
+        for id, v in enumerate(self.var):  # 计算公式宽度
+            l = max([vch.x1 for vch in v]) - v[0].x0
+            log.debug(f'< {l:.1f} {v[0].x0:.1f} {v[0].y0:.1f} {v[0].cid} {v[0].font.fontname} {len(self.varl[id])} > v{id} = {"".join([ch.text for ch in v])}')
+            self.vlen.append(l)
+        self.vstk = []
+
+
 class TranslateConverter(PDFConverterEx):
     def __init__(
         self,
@@ -144,233 +439,180 @@ class TranslateConverter(PDFConverterEx):
         envs: Dict = None,
         prompt: Template = None,
         ignore_cache: bool = False,
+        streaming: bool = True,
+        cancellation_event: asyncio.Event = None,
     ) -> None:
         super().__init__(rsrcmgr)
+        self.cancellation_event = cancellation_event  # 设置后立即停止翻译当前页面
+        self.streaming = streaming  # 渲染字符时直接送入解析状态机，不构建 LTPage
         self.vfont = vfont
         self.vchar = vchar
         self.thread = thread
+        self.untranslated = 0  # 翻译失败、保留原文的段落数
         self.layout = layout
         self.noto_name = noto_name
         self.noto = noto
+        self.glyph_cache: dict[str, tuple[str, float, bytes]] = {}  # 字符 -> (字体 ID, 单位宽度, 编码)，按文档缓存
         self.translator: BaseTranslator = None
-        # e.g. "ollama:gemma2:9b" -> ["ollama", "gemma2:9b"]
-        param = service.split(":", 1)
-        service_name = param[0]
-        service_model = param[1] if len(param) > 1 else None
-        if not envs:
-            envs = {}
-        for translator in [GoogleTranslator, BingTranslator, DeepLTranslator, DeepLXTranslator, OllamaTranslator, XinferenceTranslator, AzureOpenAITranslator,
-                           OpenAITranslator, ZhipuTranslator, ModelScopeTranslator, SiliconTranslator, GeminiTranslator, AzureTranslator, TencentTranslator, DifyTranslator, AnythingLLMTranslator, ArgosTranslator, GrokTranslator, GroqTranslator, DeepseekTranslator, OpenAIlikedTranslator, QwenMtTranslator, X302AITranslator]:
-            if service_name == translator.name:
-                self.translator = translator(lang_in, lang_out, service_model, envs=envs, prompt=prompt, ignore_cache=ignore_cache)
-        if not self.translator:
-            raise ValueError("Unsupported translation service")
-
-    def receive_layout(self, ltpage: LTPage):
-        # 段落
-        sstk: list[str] = []            # 段落文字栈
-        pstk: list[Paragraph] = []      # 段落属性栈
-        vbkt: int = 0                   # 段落公式括号计数
-        # 公式组
-        vstk: list[LTChar] = []         # 公式符号组
-        vlstk: list[LTLine] = []        # 公式线条组
-        vfix: float = 0                 # 公式纵向偏移
-        # 公式组栈
-        var: list[list[LTChar]] = []    # 公式符号组栈
-        varl: list[list[LTLine]] = []   # 公式线条组栈
-        varf: list[float] = []          # 公式纵向偏移栈
-        vlen: list[float] = []          # 公式宽度栈
-        # 全局
-        lstk: list[LTLine] = []         # 全局线条栈
-        xt: LTChar = None               # 上一个字符
-        xt_cls: int = -1                # 上一个字符所属段落，保证无论第一个字符属于哪个类别都可以触发新段落
-        vmax: float = ltpage.width / 4  # 行内公式最大宽度
-        ops: str = ""                   # 渲染结果
-
-        def vflag(font: str, char: str):    # 匹配公式（和角标）字体
-            if isinstance(font, bytes):     # 不一定能 decode，直接转 str
-                try:
-                    font = font.decode('utf-8')  # 尝试使用 UTF-8 解码
-                except UnicodeDecodeError:
-                    font = ""
-            font = font.split("+")[-1]      # 字体名截断
-            if re.match(r"\(cid:", char):
+        # 相同配置的翻译器在文档间复用，批量翻译时共享客户端连接池和缓存
+        self.translator = get_translator(service, lang_in, lang_out, envs, prompt, ignore_cache)
+
+    def begin_page(self, page, ctm) -> None:
+        super().begin_page(page, ctm)
+        if self.streaming:
+            self.cur_item = LayoutParser(self, self.cur_item.pageid, self.cur_item.width)
+
+    def begin_figure(self, name, bbox, matrix) -> None:
+        super().begin_figure(name, bbox, matrix)
+        if self.streaming:
+            self.cur_item = LayoutParser(self, self.cur_item.pageid, self.cur_item.width)
+
+    def render_image(self, name, stream) -> None:
+        # 图片不参与排版，流式模式下直接跳过
+        if not self.streaming:
+            super().render_image(name, stream)
+
+    def render_char(self, matrix, font, fontsize: float, scaling: float, rise: float, cid: int, ncs, graphicstate: PDFGraphicState) -> float:
+        # 流式模式下只构建轻量的 Glyph
+        if not self.streaming:
+            return super().render_char(matrix, font, fontsize, scaling, rise, cid, ncs, graphicstate)
+        try:
+            text = font.to_unichr(cid)
+            assert isinstance(text, str), str(type(text))
+        except PDFUnicodeNotDefined:
+            text = self.handle_undefined_char(font, cid)
+        item = Glyph(matrix, font, fontsize, scaling, rise, text, font.char_width(cid), font.char_disp(cid), cid)
+        self.cur_item.add(item)
+        return item.adv
+
+    def glyph(self, ch: str) -> tuple[str, float, bytes]:
+        # 查询译文字符的字体、单位字号宽度和编码，同一文档内只计算一次
+        try:
+            return self.glyph_cache[ch]
+        except KeyError:
+            pass
+        tiro = self.fontmap.get("tiro")
+        try:
+            if tiro is not None and tiro.to_unichr(ord(ch)) == ch:
+                rch = hex_code(ord(ch), isinstance(tiro, PDFCIDFont))  # 判断编码长度
+                glyph = ("tiro", tiro.char_width(ord(ch)), rch)  # 默认拉丁字体
+                self.glyph_cache[ch] = glyph
+                return glyph
+        except Exception:
+            pass
+        # 默认非拉丁字体
+        with mupdf_lock:
+            glyph = (self.noto_name, self.noto.char_lengths(ch, 1)[0], hex_code(self.noto.has_glyph(ord(ch)), True))
+        if tiro is not None:  # 部分 xobj 没有注入 tiro，此时不缓存以免影响其他页面
+            self.glyph_cache[ch] = glyph
+        return glyph
+
+    def vflag(self, font: str, char: str):  # 匹配公式（和角标）字体
+        if isinstance(font, bytes):     # 不一定能 decode，直接转 str
+            try:
+                font = font.decode('utf-8')  # 尝试使用 UTF-8 解码
+            except UnicodeDecodeError:
+                font = ""
+        font = font.split("+")[-1]      # 字体名截断
+        if re.match(r"\(cid:", char):
+            return True
+        # 基于字体名规则的判定
+        if self.vfont:
+            if re.match(self.vfont, font):
                 return True
-            # 基于字体名规则的判定
-            if self.vfont:
-                if re.match(self.vfont, font):
-                    return True
-            else:
-                if re.match(                                            # latex 字体
-                    r"(CM[^R]|MS.M|XY|MT|BL|RM|EU|LA|RS|LINE|LCIRCLE|TeX-|rsfs|txsy|wasy|stmary|.*Mono|.*Code|.*Ital|.*Sym|.*Math)",
-                    font,
-                ):
-                    return True
-            # 基于字符集规则的判定
-            if self.vchar:
-                if re.match(self.vchar, char):
-                    return True
-            else:
-                if (
-                    char
-                    and char != " "                                     # 非空格
-                    and (
-                        unicodedata.category(char[0])
-                        in ["Lm", "Mn", "Sk", "Sm", "Zl", "Zp", "Zs"]   # 文字修饰符、数学符号、分隔符号
-                        or ord(char[0]) in range(0x370, 0x400)          # 希腊字母
-                    )
-                ):
-                    return True
-            return False
+        else:
+            if re.match(                                            # latex 字体
+                r"(CM[^R]|MS.M|XY|MT|BL|RM|EU|LA|RS|LINE|LCIRCLE|TeX-|rsfs|txsy|wasy|stmary|.*Mono|.*Code|.*Ital|.*Sym|.*Math)",
+                font,
+            ):
+                return True
+        # 基于字符集规则的判定
+        if self.vchar:
+            if re.match(self.vchar, char):
+                return True
+        else:
+            if (
+                char
+                and char != " "                                     # 非空格
+                and (
+                    unicodedata.category(char[0])
+                    in ["Lm", "Mn", "Sk", "Sm", "Zl", "Zp", "Zs"]   # 文字修饰符、数学符号、分隔符号
+                    or ord(char[0]) in range(0x370, 0x400)          # 希腊字母
+                )
+            ):
+                return True
+        return False
 
+    def receive_layout(self, ltpage: LTPage | LayoutParser):
         ############################################################
         # A. 原文档解析
-        for child in ltpage:
-            if isinstance(child, LTChar):
-                cur_v = False
-                layout = self.layout[ltpage.pageid]
-                # ltpage.height 可能是 fig 里面的高度，这里统一用 layout.shape
-                h, w = layout.shape
-                # 读取当前字符在 layout 中的类别
-                cx, cy = np.clip(int(child.x0), 0, w - 1), np.clip(int(child.y0), 0, h - 1)
-                cls = layout[cy, cx]
-                # 锚定文档中 bullet 的位置
-                if child.get_text() == "•":
-                    cls = 0
-                # 判定当前字符是否属于公式
-                if (                                                                                        # 判定当前字符是否属于公式
-                    cls == 0                                                                                # 1. 类别为保留区域
-                    or (cls == xt_cls and len(sstk[-1].strip()) > 1 and child.size < pstk[-1].size * 0.79)  # 2. 角标字体，有 0.76 的角标和 0.799 的大写，这里用 0.79 取中，同时考虑首字母放大的情况
-                    or vflag(child.fontname, child.get_text())                                              # 3. 公式字体
-                    or (child.matrix[0] == 0 and child.matrix[3] == 0)                                      # 4. 垂直字体
-                ):
-                    cur_v = True
-                # 判定括号组是否属于公式
-                if not cur_v:
-                    if vstk and child.get_text() == "(":
-                        cur_v = True
-                        vbkt += 1
-                    if vbkt and child.get_text() == ")":
-                        cur_v = True
-                        vbkt -= 1
-                if (                                                        # 判定当前公式是否结束
-                    not cur_v                                               # 1. 当前字符不属于公式
-                    or cls != xt_cls                                        # 2. 当前字符与前一个字符不属于同一段落
-                    # or (abs(child.x0 - xt.x0) > vmax and cls != 0)        # 3. 段落内换行，可能是一长串斜体的段落，也可能是段内分式换行，这里设个阈值进行区分
-                    # 禁止纯公式（代码）段落换行，直到文字开始再重开文字段落，保证只存在两种情况
-                    # A. 纯公式（代码）段落（锚定绝对位置）sstk[-1]=="" -> sstk[-1]=="{v*}"
-                    # B. 文字开头段落（排版相对位置）sstk[-1]!=""
-                    or (sstk[-1] != "" and abs(child.x0 - xt.x0) > vmax)    # 因为 cls==xt_cls==0 一定有 sstk[-1]==""，所以这里不需要再判定 cls!=0
-                ):
-                    if vstk:
-                        if (                                                # 根据公式右侧的文字修正公式的纵向偏移
-                            not cur_v                                       # 1. 当前字符不属于公式
-                            and cls == xt_cls                               # 2. 当前字符与前一个字符属于同一段落
-                            and child.x0 > max([vch.x0 for vch in vstk])    # 3. 当前字符在公式右侧
-                        ):
-                            vfix = vstk[0].y0 - child.y0
-                        if sstk[-1] == "":
-                            xt_cls = -1 # 禁止纯公式段落（sstk[-1]=="{v*}"）的后续连接，但是要考虑新字符和后续字符的连接，所以这里修改的是上个字符的类别
-                        sstk[-1] += f"{{v{len(var)}}}"
-                        var.append(vstk)
-                        varl.append(vlstk)
-                        varf.append(vfix)
-                        vstk = []
-                        vlstk = []
-                        vfix = 0
-                # 当前字符不属于公式或当前字符是公式的第一个字符
-                if not vstk:
-                    if cls == xt_cls:               # 当前字符与前一个字符属于同一段落
-                        if child.x0 > xt.x1 + 1:    # 添加行内空格
-                            sstk[-1] += " "
-                        elif child.x1 < xt.x0:      # 添加换行空格并标记原文段落存在换行
-                            sstk[-1] += " "
-                            pstk[-1].brk = True
-                    else:                           # 根据当前字符构建一个新的段落
-                        sstk.append("")
-                        pstk.append(Paragraph(child.y0, child.x0, child.x0, child.x0, child.y0, child.y1, child.size, False))
-                if not cur_v:                                               # 文字入栈
-                    if (                                                    # 根据当前字符修正段落属性
-                        child.size > pstk[-1].size                          # 1. 当前字符比段落字体大
-                        or len(sstk[-1].strip()) == 1                       # 2. 当前字符为段落第二个文字（考虑首字母放大的情况）
-                    ) and child.get_text() != " ":                          # 3. 当前字符不是空格
-                        pstk[-1].y -= child.size - pstk[-1].size            # 修正段落初始纵坐标，假设两个不同大小字符的上边界对齐
-                        pstk[-1].size = child.size
-                    sstk[-1] += child.get_text()
-                else:                                                       # 公式入栈
-                    if (                                                    # 根据公式左侧的文字修正公式的纵向偏移
-                        not vstk                                            # 1. 当前字符是公式的第一个字符
-                        and cls == xt_cls                                   # 2. 当前字符与前一个字符属于同一段落
-                        and child.x0 > xt.x0                                # 3. 前一个字符在公式左侧
-                    ):
-                        vfix = child.y0 - xt.y0
-                    vstk.append(child)
-                # 更新段落边界，因为段落内换行之后可能是公式开头，所以要在外边处理
-                pstk[-1].x0 = min(pstk[-1].x0, child.x0)
-                pstk[-1].x1 = max(pstk[-1].x1, child.x1)
-                pstk[-1].y0 = min(pstk[-1].y0, child.y0)
-                pstk[-1].y1 = max(pstk[-1].y1, child.y1)
-                # 更新上一个字符
-                xt = child
-                xt_cls = cls
-            elif isinstance(child, LTFigure):   # 图表
-                pass
-            elif isinstance(child, LTLine):     # 线条
-                layout = self.layout[ltpage.pageid]
-                # ltpage.height 可能是 fig 里面的高度，这里统一用 layout.shape
-                h, w = layout.shape
-                # 读取当前线条在 layout 中的类别
-                cx, cy = np.clip(int(child.x0), 0, w - 1), np.clip(int(child.y0), 0, h - 1)
-                cls = layout[cy, cx]
-                if vstk and cls == xt_cls:      # 公式线条
-                    vlstk.append(child)
-                else:                           # 全局线条
-                    lstk.append(child)
-            else:
-                pass
-        # 处理结尾
-        if vstk:    # 公式出栈
-            sstk[-1] += f"{{v{len(var)}}}"
-            var.append(vstk)
-            varl.append(vlstk)
-            varf.append(vfix)
-        log.debug("\n==========[VSTACK]==========\n")
-        for id, v in enumerate(var):  # 计算公式宽度
-            l = max([vch.x1 for vch in v]) - v[0].x0
-            log.debug(f'< {l:.1f} {v[0].x0:.1f} {v[0].y0:.1f} {v[0].cid} {v[0].fontname} {len(varl[id])} > v{id} = {"".join([ch.get_text() for ch in v])}')
-            vlen.append(l)
+        if isinstance(ltpage, LayoutParser):  # 流式模式下字符已经在渲染时解析
+            parser = ltpage
+        else:
+            parser = LayoutParser(self, ltpage.pageid, ltpage.width)
+            for child in ltpage:
+                parser.add(child)
+        parser.finish()
+        sstk, pstk, var, varl, varf, vlen, lstk = parser.sstk, parser.pstk, parser.var, parser.varl, parser.varf, parser.vlen, parser.lstk
 
         ############################################################
         # B. 段落翻译
         log.debug("\n==========[SSTACK]==========\n")
 
-        @retry(wait=wait_fixed(1))
+        # 限流由翻译器的限流器等待和重试，这里只对偶发错误重试有限次
+        inflight = set()
+        @retry(stop=stop_after_attempt(3), wait=wait_fixed(1), reraise=True)
+        def translate(s: str):
+            if self.cancellation_event and self.cancellation_event.is_set():
+                raise CancelledError("task cancelled")
+            # 请求在翻译器事件循环上执行，保留 future 以便取消时中止进行中的请求
+            future = submit_async(self.translator.atranslate(s))
+            inflight.add(future)
+            if self.cancellation_event and self.cancellation_event.is_set():
+                future.cancel()
+            try:
+                return future.result()
+            finally:
+                inflight.discard(future)
+
+        def skip(s: str):  # 空白和公式不翻译
+            return not s.strip() or re.match(r"^\{v\d+\}$", s)
+
+        errors = []
         def worker(s: str):  # 多线程翻译
-            if not s.strip() or re.match(r"^\{v\d+\}$", s):  # 空白和公式不翻译
+            if skip(s):
                 return s
             try:
-                new = self.translator.translate(s)
-                return new
-            except BaseException as e:
-                if log.isEnabledFor(logging.DEBUG):
-                    log.exception(e)
-                else:
-                    log.exception(e, exc_info=False)
-                raise e
-        with concurrent.futures.ThreadPoolExecutor(
-            max_workers=self.thread
-        ) as executor:
-            news = list(executor.map(worker, sstk))
+                return translate(s)
+            except Exception as e:  # 重试后仍失败时保留原文，不中断整个文档
+                log.warning(f"Translation failed, keeping the source text: {e!r}", exc_info=log.isEnabledFor(logging.DEBUG))
+                errors.append(e)
+                return s
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.thread)
+        futures = [executor.submit(worker, s) for s in sstk]
+        try:
+            # 定期检查取消信号，不必等待所有段落翻译完成
+            while concurrent.futures.wait(futures, timeout=0.1)[1]:
+                if self.cancellation_event and self.cancellation_event.is_set():
+                    raise CancelledError("task cancelled")
+            news = [future.result() for future in futures]
+            # 整页段落全部失败多半是服务不可用或配置错误，直接报错而不是输出原文
+            if errors and len(errors) == sum(not skip(s) for s in sstk):
+                raise errors[-1]
+            self.untranslated += len(errors)
+        finally:
+            # 取消或出错时丢弃排队的段落，并取消进行中的请求
+            executor.shutdown(wait=False, cancel_futures=True)
+            for future in list(inflight):
+                future.cancel()
 
         ############################################################
         # C. 新文档排版
-        def raw_string(fcur: str, cstk: str):  # 编码字符串
-            if fcur == self.noto_name:
-                return "".join(["%04x" % self.noto.has_glyph(ord(c)) for c in cstk])
-            elif isinstance(self.fontmap[fcur], PDFCIDFont):  # 判断编码长度
-                return "".join(["%04x" % ord(c) for c in cstk])
-            else:
-                return "".join(["%02x" % ord(c) for c in cstk])
+        def raw_string(fcur: str, cstk: str) -> bytes:  # 编码字符串
+            if fcur == self.noto_name or fcur == "tiro":  # 译文字体查缓存
+                return b"".join([self.glyph(c)[2] for c in cstk])
+            cid = isinstance(self.fontmap[fcur], PDFCIDFont)  # 判断编码长度
+            return b"".join([hex_code(ord(c), cid) for c in cstk])
 
         # 根据目标语言获取默认行距
         LANG_LINEHEIGHT_MAP = {
@@ -379,13 +621,7 @@ class TranslateConverter(PDFConverterEx):
         }
         default_line_height = LANG_LINEHEIGHT_MAP.get(self.translator.lang_out.lower(), 1.1) # 小语种默认1.1
         _x, _y = 0, 0
-        ops_list = []
-
-        def gen_op_txt(font, size, x, y, rtxt):
-            return f"/{font} {size:f} Tf 1 0 0 1 {x:f} {y:f} Tm [<{rtxt}>] TJ "
-
-        def gen_op_line(x, y, xlen, ylen, linewidth):
-            return f"ET q 1 0 0 1 {x:f} {y:f} cm [] 0 d 0 J {linewidth:f} w 0 0 m {xlen:f} {ylen:f} l S Q BT "
+        writer = ContentWriter()
 
         for id, new in enumerate(news):
             x: float = pstk[id].x                       # 段落初始横坐标
@@ -400,88 +636,48 @@ class TranslateConverter(PDFConverterEx):
             lidx = 0                                    # 记录换行次数
             tx = x
             fcur_ = fcur
-            ptr = 0
             log.debug(f"< {y} {x} {x0} {x1} {size} {brk} > {sstk[id]} | {new}")
 
-            ops_vals: list[dict] = []
+            ops_vals: list[TextOp | LineOp] = []
 
-            while ptr < len(new):
-                vy_regex = re.match(
-                    r"\{\s*v([\d\s]+)\}", new[ptr:], re.IGNORECASE
-                )  # 匹配 {vn} 公式标记
+            for token in chain.from_iterable(chain(run, (vid,)) for run, vid in split_formula(new)):
                 mod = 0  # 文字修饰符
-                if vy_regex:  # 加载公式
-                    ptr += len(vy_regex.group(0))
-                    try:
-                        vid = int(vy_regex.group(1).replace(" ", ""))
-                        adv = vlen[vid]
-                    except Exception:
+                is_var = not isinstance(token, str)
+                if is_var:  # 加载公式
+                    if token is None or token >= len(vlen):
                         continue  # 翻译器可能会自动补个越界的公式标记
-                    if var[vid][-1].get_text() and unicodedata.category(var[vid][-1].get_text()[0]) in ["Lm", "Mn", "Sk"]:  # 文字修饰符
+                    vid = token
+                    adv = vlen[vid]
+                    if var[vid][-1].text and unicodedata.category(var[vid][-1].text[0]) in ["Lm", "Mn", "Sk"]:  # 文字修饰符
                         mod = var[vid][-1].width
                 else:  # 加载文字
-                    ch = new[ptr]
-                    fcur_ = None
-                    try:
-                        if fcur_ is None and self.fontmap["tiro"].to_unichr(ord(ch)) == ch:
-                            fcur_ = "tiro"  # 默认拉丁字体
-                    except Exception:
-                        pass
-                    if fcur_ is None:
-                        fcur_ = self.noto_name  # 默认非拉丁字体
-                    if fcur_ == self.noto_name: # FIXME: change to CONST
-                        adv = self.noto.char_lengths(ch, size)[0]
-                    else:
-                        adv = self.fontmap[fcur_].char_width(ord(ch)) * size
-                    ptr += 1
+                    ch = token
+                    fcur_, adv, _ = self.glyph(ch)
+                    adv *= size
                 if (                                # 输出文字缓冲区
                     fcur_ != fcur                   # 1. 字体更新
-                    or vy_regex                     # 2. 插入公式
+                    or is_var                       # 2. 插入公式
                     or x + adv > x1 + 0.1 * size    # 3. 到达右边界（可能一整行都被符号化，这里需要考虑浮点误差）
                 ):
                     if cstk:
-                        ops_vals.append({
-                            "type": OpType.TEXT,
-                            "font": fcur,
-                            "size": size,
-                            "x": tx,
-                            "dy": 0,
-                            "rtxt": raw_string(fcur, cstk),
-                            "lidx": lidx
-                        })
+                        ops_vals.append(TextOp(fcur, size, tx, 0, raw_string(fcur, cstk), lidx))
                         cstk = ""
                 if brk and x + adv > x1 + 0.1 * size:  # 到达右边界且原文段落存在换行
                     x = x0
                     lidx += 1
-                if vy_regex:  # 插入公式
+                if is_var:  # 插入公式
                     fix = 0
                     if fcur is not None:  # 段落内公式修正纵向偏移
                         fix = varf[vid]
                     for vch in var[vid]:  # 排版公式字符
                         vc = chr(vch.cid)
-                        ops_vals.append({
-                            "type": OpType.TEXT,
-                            "font": self.fontid[vch.font],
-                            "size": vch.size,
-                            "x": x + vch.x0 - var[vid][0].x0,
-                            "dy": fix + vch.y0 - var[vid][0].y0,
-                            "rtxt": raw_string(self.fontid[vch.font], vc),
-                            "lidx": lidx
-                        })
+                        ops_vals.append(TextOp(self.fontid[vch.font], vch.size, x + vch.x0 - var[vid][0].x0, fix + vch.y0 - var[vid][0].y0, raw_string(self.fontid[vch.font], vc), lidx))
                         if log.isEnabledFor(logging.DEBUG):
                             lstk.append(LTLine(0.1, (_x, _y), (x + vch.x0 - var[vid][0].x0, fix + y + vch.y0 - var[vid][0].y0)))
                             _x, _y = x + vch.x0 - var[vid][0].x0, fix + y + vch.y0 - var[vid][0].y0
                     for l in varl[vid]:  # 排版公式线条
                         if l.linewidth < 5:  # hack 有的文档会用粗线条当图片背景
-                            ops_vals.append({
-                                "type": OpType.LINE,
-                                "x": l.pts[0][0] + x - var[vid][0].x0,
-                                "dy": l.pts[0][1] + fix - var[vid][0].y0,
-                                "linewidth": l.linewidth,
-                                "xlen": l.pts[1][0] - l.pts[0][0],
-                                "ylen": l.pts[1][1] - l.pts[0][1],
-                                "lidx": lidx
-                            })
+                            ops_vals.append(LineOp(l.pts[0][0] + x - var[vid][0].x0, l.pts[0][1] + fix - var[vid][0].y0, l.pts[1][0] - l.pts[0][0], l.pts[1][1] - l.pts[0][1], l.linewidth, lidx))
                 else:  # 插入文字缓冲区
                     if not cstk:  # 单行开头
                         tx = x
@@ -499,15 +695,7 @@ class TranslateConverter(PDFConverterEx):
                     _x, _y = x, y
             # 处理结尾
             if cstk:
-                ops_vals.append({
-                    "type": OpType.TEXT,
-                    "font": fcur,
-                    "size": size,
-                    "x": tx,
-                    "dy": 0,
-                    "rtxt": raw_string(fcur, cstk),
-                    "lidx": lidx
-                })
+                ops_vals.append(TextOp(fcur, size, tx, 0, raw_string(fcur, cstk), lidx))
 
             line_height = default_line_height
 
@@ -515,19 +703,14 @@ class TranslateConverter(PDFConverterEx):
                 line_height -= 0.05
 
             for vals in ops_vals:
-                if vals["type"] == OpType.TEXT:
-                    ops_list.append(gen_op_txt(vals["font"], vals["size"], vals["x"], vals["dy"] + y - vals["lidx"] * size * line_height, vals["rtxt"]))
-                elif vals["type"] == OpType.LINE:
-                    ops_list.append(gen_op_line(vals["x"], vals["dy"] + y - vals["lidx"] * size * line_height, vals["xlen"], vals["ylen"], vals["linewidth"]))
+                if vals.type == OpType.TEXT:
+                    writer.text(vals.font, vals.size, vals.x, vals.dy + y - vals.lidx * size * line_height, vals.rtxt)
+                elif vals.type == OpType.LINE:
+                    writer.line(vals.x, vals.dy + y - vals.lidx * size * line_height, vals.xlen, vals.ylen, vals.linewidth)
 
         for l in lstk:  # 排版全局线条
             if l.linewidth < 5:  # hack 有的文档会用粗线条当图片背景
-                ops_list.append(gen_op_line(l.pts[0][0], l.pts[0][1], l.pts[1][0] - l.pts[0][0], l.pts[1][1] - l.pts[0][1], l.linewidth))
-
-        ops = f"BT {''.join(ops_list)}ET "
-        return ops
+                writer.line(l.pts[0][0], l.pts[0][1], l.pts[1][0] - l.pts[0][0], l.pts[1][1] - l.pts[0][1], l.linewidth)
 
+        return writer.getvalue()
 
-class OpType(Enum):
-    TEXT = "text"
-    LINE = "line"
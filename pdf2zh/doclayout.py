@@ -1,4 +1,5 @@
 import abc
+import hashlib
 import os.path
 
 import cv2
@@ -79,6 +80,7 @@ class OnnxModel(DocLayoutModel):
         self._names = ast.literal_eval(metadata["names"])
 
         self.model = onnxruntime.InferenceSession(model.SerializeToString())
+        self._identity = None
 
     @staticmethod
     def from_pretrained():
@@ -89,6 +91,17 @@ class OnnxModel(DocLayoutModel):
     def stride(self):
         return self._stride
 
+    @property
+    def identity(self) -> str:
+        """Digest of the model file, pages cached with another model are not reused."""
+        if self._identity is None:
+            h = hashlib.sha256()
+            with open(self.model_path, "rb") as f:
+                while chunk := f.read(1 << 20):
+                    h.update(chunk)
+            self._identity = h.hexdigest()
+        return self._identity
+
     def resize_and_pad_image(self, image, new_shape):
         """
         Resize and pad the image to the specified size, ensuring dimensions are multiples of stride.
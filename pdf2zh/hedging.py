@@ -0,0 +1,104 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from pdf2zh.config import ConfigManager
+
+logger = logging.getLogger(__name__)
+
+class HedgePolicy:
+    """
+    Fire a duplicate of a request running longer than the observed latency quantile
+    of the service, and take whichever finishes first.
+    Hedges never exceed budget × requests.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        budget: float = 0.05,
+        quantile: float = 0.95,
+        min_samples: int = 20,
+        window: int = 200,
+    ):
+        self.name = name
+        self.budget = budget
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.latencies = deque(maxlen=window)  # 最近成功请求的耗时
+        self.requests = 0
+        self.hedges = 0
+        self.lock = threading.Lock()
+
+    def delay(self) -> Optional[float]:
+        """Return how long to wait before hedging, None if not enough samples yet"""
+        with self.lock:
+            self.requests += 1
+            if len(self.latencies) < self.min_samples:
+                return None
+            latencies = sorted(self.latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * self.quantile))]
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.hedges + 1 > self.budget * self.requests:
+                return False
+            self.hedges += 1
+            return True
+
+    def record(self, start: float) -> None:
+        with self.lock:
+            self.latencies.append(time.monotonic() - start)
+
+    async def atimed(self, func, text: str):
+        start = time.monotonic()
+        result = await func(text)
+        self.record(start)
+        return result
+
+    async def acall(self, func, text: str):
+        """Await func(text), hedged after the latency quantile"""
+        delay = self.delay()
+        if delay is None:
+            return await self.atimed(func, text)
+        tasks = {asyncio.ensure_future(self.atimed(func, text))}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and self.allow():
+                logger.debug(f"{self.name} request exceeded {delay:.2f}s, hedging")
+                tasks.add(asyncio.ensure_future(self.atimed(func, text)))
+            # 先成功的结果胜出，只有全部失败时才抛出异常
+            while True:
+                done, tasks = await asyncio.wait(
+                    tasks, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None or not tasks:
+                        return task.result()
+        finally:
+            for task in tasks:  # 取消落后的请求
+                task.cancel()
+
+
+hedgers: dict[str, Optional[HedgePolicy]] = {}
+hedgers_lock = threading.Lock()
+
+
+def get_hedger(name: str) -> Optional[HedgePolicy]:
+    """
+    Return the process-wide hedging policy of a translation service, None if disabled.
+    Hedging is opt-in via the HEDGING config, e.g.
+    {"openai": {"budget": 0.05, "quantile": 0.95}}
+    """
+    with hedgers_lock:
+        if name not in hedgers:
+            config = ConfigManager.get("HEDGING") or {}
+            if isinstance(config, str):  # 来自环境变量
+                config = json.loads(config)
+            options = config.get(name)
+            hedgers[name] = None if options is None else HedgePolicy(name, **options)
+        return hedgers[name]
@@ -1,16 +1,21 @@
 """Functions that can be used for the most common use-cases for pdf2zh.six"""
 
 import asyncio
+import concurrent.futures
+import hashlib
 import io
+import json
 import os
 import re
 import sys
 import tempfile
+import time
 import logging
 from asyncio import CancelledError
+from collections import Counter
 from pathlib import Path
 from string import Template
-from typing import Any, BinaryIO, List, Optional, Dict
+from typing import Any, BinaryIO, List, Optional, Dict, Union
 
 import numpy as np
 import requests
@@ -22,15 +27,38 @@ from pdfminer.pdfpage import PDFPage
 from pdfminer.pdfparser import PDFParser
 from pymupdf import Document, Font
 
-from pdf2zh.converter import TranslateConverter
+from pdf2zh.converter import TranslateConverter, mupdf_lock
 from pdf2zh.doclayout import OnnxModel
-from pdf2zh.pdfinterp import PDFPageInterpreterEx
+from pdf2zh.pdfinterp import PDFPageInterpreterEx, page_digest
+from pdf2zh.cache import (
+    PageCache,
+    PageCheckpoint,
+    checkpoint_path,
+    remove_checkpoint,
+)
 
 from pdf2zh.config import ConfigManager
 from babeldoc.assets.assets import get_font_and_metadata
 
 NOTO_NAME = "noto"
 
+# 排版代码的摘要，升级或修改代码后页面缓存失效
+CODE_DIGEST = hashlib.sha256(
+    b"".join(
+        Path(sys.modules[name].__file__).read_bytes()
+        for name in (__name__, TranslateConverter.__module__, page_digest.__module__)
+    )
+).hexdigest()
+
+OUTPUTS = ("both", "mono", "dual")
+
+# 输出 PDF 的保存配置：deflate 压缩、garbage 回收级别、对象流、字体子集化
+SAVE_PROFILES = {
+    "fast": {"deflate": True, "garbage": 1, "use_objstms": 1, "subset_fonts": False},
+    "balanced": {"deflate": True, "garbage": 3, "use_objstms": 1, "subset_fonts": True},
+    "smallest": {"deflate": True, "garbage": 4, "use_objstms": 1, "subset_fonts": True},
+}
+
 logger = logging.getLogger(__name__)
 
 noto_list = [
@@ -67,6 +95,50 @@ def check_files(files: List[str]) -> List[str]:
     return missing_files
 
 
+def load_manifest(
+    path: Path, options: str, outputs: tuple[Optional[str], Optional[str]]
+) -> Optional[dict]:
+    """Return the manifest entry if it matches the options and all outputs exist"""
+    try:
+        entry = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+    if entry.get("options") != options or entry.get("outputs") != list(outputs):
+        return None
+    if not all(os.path.exists(p) for p in outputs if p):
+        return None
+    return entry
+
+
+def save_manifest(
+    path: Path,
+    stat: os.stat_result,
+    digest: str,
+    options: str,
+    outputs: tuple[Optional[str], Optional[str]],
+) -> None:
+    entry = {
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "digest": digest,
+        "options": options,
+        "outputs": list(outputs),
+    }
+    # 先写临时文件再替换，中断时不会留下半个清单
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(entry))
+    os.replace(tmp, path)
+
+
+def new_page_xref(doc_zh: Document, page: PDFPage) -> None:
+    # 新建一个 xref 存放新指令流
+    with mupdf_lock:
+        page.page_xref = doc_zh.get_new_xref()  # hack 插入页面的新 xref
+        doc_zh.update_object(page.page_xref, "<<>>")
+        doc_zh.update_stream(page.page_xref, b"")
+        doc_zh[page.pageno].set_contents(page.page_xref)
+
+
 def translate_patch(
     inf: BinaryIO,
     pages: Optional[list[int]] = None,
@@ -85,8 +157,9 @@ def translate_patch(
     envs: Dict = None,
     prompt: Template = None,
     ignore_cache: bool = False,
+    checkpoint: Optional[str] = None,
     **kwarg: Any,
-) -> None:
+) -> tuple[dict, int]:
     rsrcmgr = PDFResourceManager()
     layout = {}
     device = TranslateConverter(
@@ -103,11 +176,27 @@ def translate_patch(
         envs,
         prompt,
         ignore_cache,
+        cancellation_event=cancellation_event,
     )
 
     assert device is not None
     obj_patch = {}
     interpreter = PDFPageInterpreterEx(rsrcmgr, device, obj_patch)
+    # 按页面内容摘要缓存排版结果，重新翻译时只处理变化的页面
+    from pdf2zh import __version__
+
+    page_params = {
+        "version": __version__,
+        "code": CODE_DIGEST,
+        "model": getattr(model, "identity", type(model).__name__),
+        **device.translator.cache_params(),
+        "noto": noto.name if noto else "",
+        "vfont": vfont,
+        "vchar": vchar,
+    }
+    page_cache = PageCache(page_params)
+    # checkpoint 记录本次运行已完成的页面，中断后可以从断点继续
+    page_checkpoint = PageCheckpoint(checkpoint, page_params)
     if pages:
         total_pages = len(pages)
     else:
@@ -115,7 +204,7 @@ def translate_patch(
 
     parser = PDFParser(inf)
     doc = PDFDocument(parser)
-    with tqdm.tqdm(total=total_pages) as progress:
+    with tqdm.tqdm(total=total_pages) as progress, page_checkpoint:
         for pageno, page in enumerate(PDFPage.create_pages(doc)):
             if cancellation_event and cancellation_event.is_set():
                 raise CancelledError("task cancelled")
@@ -125,10 +214,24 @@ def translate_patch(
             if callback:
                 callback(progress)
             page.pageno = pageno
-            pix = doc_zh[page.pageno].get_pixmap()
-            image = np.frombuffer(pix.samples, np.uint8).reshape(
-                pix.height, pix.width, 3
-            )[:, :, ::-1]
+            digest, forms = page_digest(page)
+            cached = page_checkpoint.get(digest)
+            if cached is None and not ignore_cache:
+                cached = page_cache.get(digest)
+            if cached is not None:  # 页面未变化，直接拼接缓存的指令流
+                new_page_xref(doc_zh, page)
+                obj_patch[page.page_xref] = cached["page"]
+                for obj in page.contents:
+                    obj_patch[obj.objid] = b""
+                for form, ops in cached["forms"].items():
+                    if form in forms:
+                        obj_patch[forms[form]] = ops
+                continue
+            with mupdf_lock:
+                pix = doc_zh[page.pageno].get_pixmap()
+                image = np.frombuffer(pix.samples, np.uint8).reshape(
+                    pix.height, pix.width, 3
+                )[:, :, ::-1]
             page_layout = model.predict(image, imgsz=int(pix.height / 32) * 32)[0]
             # kdtree 是不可能 kdtree 的，不如直接渲染成图片，用空间换时间
             box = np.ones((pix.height, pix.width))
@@ -155,19 +258,98 @@ def translate_patch(
                     )
                     box[y0:y1, x0:x1] = 0
             layout[page.pageno] = box
-            # 新建一个 xref 存放新指令流
-            page.page_xref = doc_zh.get_new_xref()  # hack 插入页面的新 xref
-            doc_zh.update_object(page.page_xref, "<<>>")
-            doc_zh.update_stream(page.page_xref, b"")
-            doc_zh[page.pageno].set_contents(page.page_xref)
+            new_page_xref(doc_zh, page)
+            interpreter.obj_patch = page_patch = {}
+            untranslated = device.untranslated
             interpreter.process_page(page)
+            obj_patch.update(page_patch)
+            if device.untranslated > untranslated:
+                continue  # 有段落保留了原文，不缓存，下次重新翻译
+            patch = {
+                "page": page_patch[page.page_xref],
+                "forms": {
+                    form: page_patch[objid]
+                    for form, objid in forms.items()
+                    if objid in page_patch
+                },
+            }
+            page_cache.set(digest, patch)
+            page_checkpoint.set(digest, patch)
 
     device.close()
-    return obj_patch
+    return obj_patch, device.untranslated
 
 
-def translate_stream(
+def resources_location(doc: Document, xref: int, key: str = "Resources"):
+    """Return (xref, key prefix) addressing the dict stored under key, or None."""
+    value = doc.xref_get_key(xref, key)
+    if value[0] == "xref":
+        return int(value[1].split()[0]), ""
+    if value[0] == "dict":
+        return xref, f"{key}/"
+    return None
+
+
+def inject_fonts(
+    doc: Document,
+    font_list: list[tuple[str, Optional[str]]],
+    pages: Optional[list[int]] = None,
+) -> dict[str, int]:
+    """Register fonts in the Resources reachable from the selected pages.
+
+    Only page resources and the form XObjects they (transitively) draw are
+    visited, instead of scanning every xref in the document.
+    """
+    font_id = {}
+    visited = set()
+    if pages:  # 超出文档页数的页码直接跳过，如 GUI 的“前 5 页”
+        pages = [pageno for pageno in pages if 0 <= pageno < doc.page_count]
+    else:
+        pages = range(doc.page_count)
+    for pageno in pages:
+        page = doc[pageno]
+        for font in font_list:  # 同一字体在文档内只嵌入一次，多页共享 xref
+            font_id[font[0]] = page.insert_font(font[0], font[1])
+        # 页面的 Resources 可能继承自父节点
+        xref, res = page.xref, None
+        while xref and (res := resources_location(doc, xref)) is None:
+            parent = doc.xref_get_key(xref, "Parent")
+            xref = int(parent[1].split()[0]) if parent[0] == "xref" else 0
+        stack = [res] if res else []
+        while stack:
+            xref, prefix = stack.pop()
+            if (xref, prefix) in visited:
+                continue
+            visited.add((xref, prefix))
+            try:  # xref 读写可能出错
+                font_res = resources_location(doc, xref, f"{prefix}Font")
+                if font_res:
+                    for font in font_list:
+                        target_key = f"{font_res[1]}{font[0]}"
+                        if doc.xref_get_key(font_res[0], target_key)[0] == "null":
+                            doc.xref_set_key(
+                                font_res[0], target_key, f"{font_id[font[0]]} 0 R"
+                            )
+                xobj_res = doc.xref_get_key(xref, f"{prefix}XObject")
+                if xobj_res[0] == "xref":
+                    xobj_res = ("dict", doc.xref_object(int(xobj_res[1].split()[0])))
+                if xobj_res[0] != "dict":
+                    continue
+                for xobj in re.findall(r"(\d+) 0 R", xobj_res[1]):  # 基于 xobj 的 res
+                    xobj = int(xobj)
+                    if doc.xref_get_key(xobj, "Subtype")[1] != "/Form":
+                        continue
+                    if xobj_loc := resources_location(doc, xobj):
+                        stack.append(xobj_loc)
+            except Exception:
+                pass
+    return font_id
+
+
+def translate_stream_to(
     stream: bytes,
+    mono: Union[str, os.PathLike, BinaryIO, None] = None,
+    dual: Union[str, os.PathLike, BinaryIO, None] = None,
     pages: Optional[list[int]] = None,
     lang_in: str = "",
     lang_out: str = "",
@@ -182,71 +364,105 @@ def translate_stream(
     prompt: Template = None,
     skip_subset_fonts: bool = False,
     ignore_cache: bool = False,
+    save_profile: str = "balanced",
+    checkpoint: Optional[str] = None,
     **kwarg: Any,
-):
+) -> None:
+    """Translate a PDF and save the results straight to mono / dual.
+
+    Each target is a path or a writable binary file object; a target left
+    as None is neither built nor serialized. With a checkpoint path, pages
+    are recorded there as they complete and skipped when the run is
+    resumed; the file is removed once both outputs are saved.
+
+    Returns the number of pages translated and the number of paragraphs
+    left in the source language because their translation kept failing.
+    """
+    if save_profile not in SAVE_PROFILES:
+        raise PDFValueError(
+            f"Invalid save profile: {save_profile}, expected one of {tuple(SAVE_PROFILES)}"
+        )
+    save_options = dict(SAVE_PROFILES[save_profile])
+    if not save_options.pop("subset_fonts"):
+        skip_subset_fonts = True
     font_list = [("tiro", None)]
 
     font_path = download_remote_fonts(lang_out.lower())
     noto_name = NOTO_NAME
-    noto = Font(noto_name, font_path)
-    font_list.append((noto_name, font_path))
-
-    doc_en = Document(stream=stream)
-    stream = io.BytesIO()
-    doc_en.save(stream)
-    doc_zh = Document(stream=stream)
-    page_count = doc_zh.page_count
-    # font_list = [("GoNotoKurrent-Regular.ttf", font_path), ("tiro", None)]
-    font_id = {}
-    for page in doc_zh:
-        for font in font_list:
-            font_id[font[0]] = page.insert_font(font[0], font[1])
-    xreflen = doc_zh.xref_length()
-    for xref in range(1, xreflen):
-        for label in ["Resources/", ""]:  # 可能是基于 xobj 的 res
-            try:  # xref 读写可能出错
-                font_res = doc_zh.xref_get_key(xref, f"{label}Font")
-                target_key_prefix = f"{label}Font/"
-                if font_res[0] == "xref":
-                    resource_xref_id = re.search("(\\d+) 0 R", font_res[1]).group(1)
-                    xref = int(resource_xref_id)
-                    font_res = ("dict", doc_zh.xref_object(xref))
-                    target_key_prefix = ""
-
-                if font_res[0] == "dict":
-                    for font in font_list:
-                        target_key = f"{target_key_prefix}{font[0]}"
-                        font_exist = doc_zh.xref_get_key(xref, target_key)
-                        if font_exist[0] == "null":
-                            doc_zh.xref_set_key(
-                                xref,
-                                target_key,
-                                f"{font_id[font[0]]} 0 R",
-                            )
-            except Exception:
-                pass
+    # PyMuPDF 不支持多线程，多个文档同时翻译时打开、修改和保存需依次进行
+    with mupdf_lock:
+        noto = Font(noto_name, font_path)
+        font_list.append((noto_name, font_path))
+
+        # 译文直接从输入缓冲区打开，不再经过一次 save/reopen
+        doc_zh = Document(stream=stream)
+        page_count = doc_zh.page_count
+        # font_list = [("GoNotoKurrent-Regular.ttf", font_path), ("tiro", None)]
+        inject_fonts(doc_zh, font_list, pages)
+
+        # 插入字体后序列化一次交给 pdfminer，BytesIO(bytes) 与缓冲区共享内存不拷贝
+        fp = io.BytesIO(doc_zh.tobytes())
+    obj_patch, untranslated = translate_patch(fp, **locals())
+    fp.close()
+
+    with mupdf_lock:
+        for obj_id, ops_new in obj_patch.items():
+            # ops_old=doc_en.xref_stream(obj_id)
+            # print(obj_id)
+            # print(ops_old)
+            # print(ops_new)
+            doc_zh.update_stream(obj_id, ops_new)
+
+        # 未请求的输出不构建、不子集化、不序列化，结果由 PyMuPDF 直接写入目标
+        if not skip_subset_fonts:
+            doc_zh.subset_fonts(fallback=True)
+        if mono is not None:
+            doc_zh.save(mono, **save_options)
+        if dual is not None:
+            # 插入已子集化的译文页，双语文件不再重复子集化这些字体
+            doc_en = Document(stream=stream)
+            doc_en.insert_file(doc_zh)
+            for id in range(page_count):
+                doc_en.move_page(page_count + id, id * 2 + 1)
+            if not skip_subset_fonts:
+                doc_en.subset_fonts(fallback=True)  # 跳过已是子集的字体
+            doc_en.save(dual, **save_options)
+    if checkpoint:
+        remove_checkpoint(checkpoint)
+    if untranslated:
+        logger.warning(f"{untranslated} paragraph(s) kept in the source language")
+    return (len(pages) if pages else page_count), untranslated
 
-    fp = io.BytesIO()
 
-    doc_zh.save(fp)
-    obj_patch: dict = translate_patch(fp, **locals())
-
-    for obj_id, ops_new in obj_patch.items():
-        # ops_old=doc_en.xref_stream(obj_id)
-        # print(obj_id)
-        # print(ops_old)
-        # print(ops_new.encode())
-        doc_zh.update_stream(obj_id, ops_new.encode())
-
-    doc_en.insert_file(doc_zh)
-    for id in range(page_count):
-        doc_en.move_page(page_count + id, id * 2 + 1)
-    if not skip_subset_fonts:
-        doc_zh.subset_fonts(fallback=True)
-        doc_en.subset_fonts(fallback=True)
+def translate_stream(
+    stream: bytes,
+    pages: Optional[list[int]] = None,
+    lang_in: str = "",
+    lang_out: str = "",
+    service: str = "",
+    thread: int = 0,
+    vfont: str = "",
+    vchar: str = "",
+    callback: object = None,
+    cancellation_event: asyncio.Event = None,
+    model: OnnxModel = None,
+    envs: Dict = None,
+    prompt: Template = None,
+    skip_subset_fonts: bool = False,
+    ignore_cache: bool = False,
+    outputs: str = "both",
+    save_profile: str = "balanced",
+    checkpoint: Optional[str] = None,
+    **kwarg: Any,
+):
+    if outputs not in OUTPUTS:
+        raise PDFValueError(f"Invalid outputs: {outputs}, expected one of {OUTPUTS}")
+    mono = io.BytesIO() if outputs != "dual" else None
+    dual = io.BytesIO() if outputs != "mono" else None
+    translate_stream_to(**locals())
     return (
-        doc_zh.write(deflate=True, garbage=3, use_objstms=1),
-        doc_en.write(deflate=True, garbage=3, use_objstms=1),
+        mono.getvalue() if mono else None,
+        dual.getvalue() if dual else None,
     )
 
 
@@ -317,10 +533,17 @@ def translate(
     prompt: Template = None,
     skip_subset_fonts: bool = False,
     ignore_cache: bool = False,
+    outputs: str = "both",
+    save_profile: str = "balanced",
+    jobs: int = 1,
+    resume: bool = False,
+    skip_unchanged: bool = False,
     **kwarg: Any,
 ):
     if not files:
         raise PDFValueError("No files to process.")
+    if outputs not in OUTPUTS:
+        raise PDFValueError(f"Invalid outputs: {outputs}, expected one of {OUTPUTS}")
 
     missing_files = check_files(files)
 
@@ -330,13 +553,53 @@ def translate(
             print(f"  {file}", file=sys.stderr)
         raise PDFValueError("Some files do not exist.")
 
-    result_files = []
-
-    for file in files:
+    # 所有文档共用同一组参数（模型、翻译器、缓存均在文档间共享）
+    params = {
+        k: v
+        for k, v in locals().items()
+        if k not in ("files", "missing_files", "kwarg", "resume", "skip_unchanged")
+    }
+    params.update(kwarg)
+    from pdf2zh import __version__
+
+    # 影响译文内容的选项，任一变化都需要重新翻译
+    options_digest = hashlib.sha256(
+        json.dumps(
+            {
+                "pages": pages,
+                "lang_in": lang_in,
+                "lang_out": lang_out,
+                "service": service,
+                "vfont": vfont,
+                "vchar": vchar,
+                "compatible": compatible,
+                "envs": envs,
+                "prompt": prompt.template if prompt else None,
+                "skip_subset_fonts": skip_subset_fonts,
+                "save_profile": save_profile,
+                "model": getattr(model, "identity", type(model).__name__),
+                "version": __version__,
+            },
+            sort_keys=True,
+            default=str,
+        ).encode()
+    ).hexdigest()
+
+    # 不同目录下的同名文件在输出名中加入路径摘要，避免互相覆盖输出和清单
+    stems = Counter(os.path.splitext(os.path.basename(file))[0] for file in files)
+
+    def translate_file(file):
+        # 清单只用于 --skip-unchanged 的本地文件，下载的文件每次都是新的临时文件
+        use_manifest = skip_unchanged
+        filename = os.path.splitext(os.path.basename(file))[0]
+        if stems[filename] > 1:
+            path_digest = hashlib.sha256(os.path.abspath(file).encode()).hexdigest()
+            filename = f"{filename}-{path_digest[:8]}"
         if type(file) is str and (
             file.startswith("http://") or file.startswith("https://")
         ):
             print("Online files detected, downloading...")
+            use_manifest = False
             try:
                 r = requests.get(file, allow_redirects=True)
                 if r.status_code == 200:
@@ -352,7 +615,28 @@ def translate(
                 raise PDFValueError(
                     f"Errors occur in downloading the PDF file. Please check the link(s).\nError:\n{e}"
                 )
-        filename = os.path.splitext(os.path.basename(file))[0]
+            filename = os.path.splitext(os.path.basename(file))[0]
+        file_mono = Path(output) / f"{filename}-mono.pdf"
+        file_dual = Path(output) / f"{filename}-dual.pdf"
+        mono = str(file_mono) if outputs != "dual" else None
+        dual = str(file_dual) if outputs != "mono" else None
+
+        # 输入文件的大小和修改时间与清单一致时直接跳过，无需读取文件
+        manifest = Path(output) / f"{filename}.manifest.json"
+        stat = os.stat(file)
+        entry = None
+        if use_manifest:
+            entry = load_manifest(manifest, options_digest, (mono, dual))
+        if entry and (entry["size"], entry["mtime_ns"]) == (
+            stat.st_size,
+            stat.st_mtime_ns,
+        ):
+            logger.info(f"Skipping up-to-date file: {file}")
+            return (mono, dual), 0
+
+        with open(file, "rb") as doc_raw:
+            s_raw = doc_raw.read()
+        digest = hashlib.sha256(s_raw).hexdigest()
 
         # If the commandline has specified converting to PDF/A format
         # --compatible / -cp
@@ -364,10 +648,8 @@ def translate(
                 convert_to_pdfa(file, tmp_pdfa.name)
                 doc_raw = open(tmp_pdfa.name, "rb")
                 os.unlink(tmp_pdfa.name)
-        else:
-            doc_raw = open(file, "rb")
-        s_raw = doc_raw.read()
-        doc_raw.close()
+            s_raw = doc_raw.read()
+            doc_raw.close()
 
         temp_dir = Path(tempfile.gettempdir())
         file_path = Path(file)
@@ -380,21 +662,42 @@ def translate(
         except Exception as e:
             logger.warning(f"Failed to clean temp file {file_path}", exc_info=True)
 
-        s_mono, s_dual = translate_stream(
-            s_raw,
-            **locals(),
+        # 文件被 touch 或重新复制但内容未变时，更新清单中的时间戳后跳过
+        if entry and entry["digest"] == digest:
+            save_manifest(manifest, stat, digest, options_digest, (mono, dual))
+            logger.info(f"Skipping up-to-date file: {file}")
+            return (mono, dual), 0
+
+        # 中断后以 --resume 重新运行同一文件时从断点继续
+        checkpoint = None
+        if resume:
+            checkpoint = checkpoint_path(
+                hashlib.sha256(f"{digest}:{options_digest}".encode()).hexdigest()
+            )
+        page_count, untranslated = translate_stream_to(
+            s_raw, mono=mono, dual=dual, checkpoint=checkpoint, **params
         )
-        file_mono = Path(output) / f"{filename}-mono.pdf"
-        file_dual = Path(output) / f"{filename}-dual.pdf"
-        doc_mono = open(file_mono, "wb")
-        doc_dual = open(file_dual, "wb")
-        doc_mono.write(s_mono)
-        doc_dual.write(s_dual)
-        doc_mono.close()
-        doc_dual.close()
-        result_files.append((str(file_mono), str(file_dual)))
-
-    return result_files
+        # 有段落保留了原文时不写清单，下次运行重新翻译
+        if use_manifest and not untranslated:
+            save_manifest(manifest, stat, digest, options_digest, (mono, dual))
+        return (mono, dual), page_count
+
+    start = time.perf_counter()
+    if jobs > 1 and len(files) > 1:
+        # 多个文档同时处理，结果仍按输入顺序返回
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(translate_file, files))
+    else:
+        results = [translate_file(file) for file in files]
+    elapsed = time.perf_counter() - start
+
+    total_pages = sum(page_count for _, page_count in results)
+    if len(files) > 1:
+        logger.info(
+            f"Translated {len(files)} files, {total_pages} pages in {elapsed:.1f}s "
+            f"({total_pages / max(elapsed, 1e-6) * 60:.1f} pages/min)"
+        )
+    return [result for result, _ in results]
 
 
 def download_remote_fonts(lang: str):
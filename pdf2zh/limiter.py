@@ -0,0 +1,165 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from pdf2zh.config import ConfigManager
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENCY = 1024  # 未配置并发上限时 AIMD 的上限
+MAX_ATTEMPTS = 100  # 被限流时的最大尝试次数
+MAX_BACKOFF = 15  # 没有 Retry-After 时的最长退避时间
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """
+    Check whether an exception is a rate limit error (HTTP 429) of any client library.
+    :return: None if not rate limited, otherwise the Retry-After seconds (0 if unknown)
+    """
+    response = getattr(exc, "response", None)
+    status = getattr(exc, "status_code", None) or getattr(response, "status_code", None)
+    if status != 429 and type(exc).__name__ not in (
+        "RateLimitError",  # openai
+        "TooManyRequestsException",  # deepl
+    ):
+        return None
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("Retry-After")
+    if not value:
+        return 0.0
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:  # HTTP-date 格式
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def estimate_tokens(text: str) -> int:
+    # 粗略估计：约 4 字节一个 token，译文与原文长度相当
+    return (len(text.encode()) // 4 + 1) * 2
+
+
+class RateLimiter:
+    """
+    Token buckets for requests and tokens per minute, plus an AIMD concurrency limit.
+    One instance is shared by every translator of the same service in the process.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        concurrency: Optional[int] = None,
+    ):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = concurrency or MAX_CONCURRENCY
+        # 当前并发上限，限流时减半，成功时线性恢复
+        self.limit = float(self.max_concurrency)
+        self.inflight = 0
+        self.requests = float(rpm or 0)  # 令牌桶余量，初始为满
+        self.tokens = float(tpm or 0)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0  # Retry-After 到期前不发送新请求
+        self.failures = 0  # 连续被限流的次数
+        self.lock = threading.Lock()
+
+    def try_acquire(self, tokens: int) -> float:
+        """Take a concurrency slot and the budget of one request, return 0 or the seconds to wait"""
+        with self.lock:
+            now = time.monotonic()
+            elapsed, self.updated = now - self.updated, now
+            if self.rpm:
+                self.requests = min(self.rpm, self.requests + elapsed * self.rpm / 60)
+            if self.tpm:
+                self.tokens = min(self.tpm, self.tokens + elapsed * self.tpm / 60)
+                tokens = min(tokens, self.tpm)  # 超过桶容量的请求只等满桶
+            if now < self.blocked_until:
+                return self.blocked_until - now
+            if self.inflight >= int(self.limit):
+                return 0.01
+            wait = 0.0
+            if self.rpm and self.requests < 1:
+                wait = (1 - self.requests) * 60 / self.rpm
+            if self.tpm and self.tokens < tokens:
+                wait = max(wait, (tokens - self.tokens) * 60 / self.tpm)
+            if wait:
+                return wait
+            self.requests -= 1
+            self.tokens -= tokens
+            self.inflight += 1
+            return 0.0
+
+    def release(self, success: bool) -> None:
+        with self.lock:
+            self.inflight -= 1
+            if success:
+                self.failures = 0
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+    def throttle(self, delay: float) -> float:
+        """Record a 429 response, return the seconds before the next request"""
+        with self.lock:
+            now = time.monotonic()
+            if now >= self.blocked_until:  # 同一批被限流的请求只减半一次
+                self.limit = max(1.0, self.limit / 2)
+            self.failures += 1
+            if not delay:
+                delay = min(2 ** (self.failures - 1), MAX_BACKOFF)
+            self.blocked_until = max(self.blocked_until, now + delay)
+            return self.blocked_until - now
+
+    async def acall(self, func, text: str):
+        """Await func(text) within the limits, retrying when rate limited"""
+        tokens = estimate_tokens(text)
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            while wait := self.try_acquire(tokens):
+                await asyncio.sleep(wait)
+            try:
+                result = await func(text)
+            except BaseException as e:  # 被取消的请求也要归还并发名额
+                self.release(False)
+                if (delay := retry_after(e)) is None or attempt == MAX_ATTEMPTS:
+                    raise
+                delay = self.throttle(delay)
+                logger.warning(
+                    f"{self.name} rate limited, retrying in {delay:.1f} seconds... "
+                    f"(Attempt {attempt}/{MAX_ATTEMPTS})"
+                )
+                continue
+            self.release(True)
+            return result
+
+
+limiters: dict[str, RateLimiter] = {}
+limiters_lock = threading.Lock()
+
+
+def get_limiter(name: str) -> RateLimiter:
+    """
+    Return the process-wide limiter of a translation service.
+    Limits are read from the RATE_LIMITS config, e.g.
+    {"openai": {"rpm": 500, "tpm": 200000, "concurrency": 16}}
+    """
+    with limiters_lock:
+        if name not in limiters:
+            config = ConfigManager.get("RATE_LIMITS") or {}
+            if isinstance(config, str):  # 来自环境变量
+                config = json.loads(config)
+            limits = config.get(name, {})
+            limiters[name] = RateLimiter(
+                name,
+                rpm=limits.get("rpm"),
+                tpm=limits.get("tpm"),
+                concurrency=limits.get("concurrency"),
+            )
+        return limiters[name]
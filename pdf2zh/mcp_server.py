@@ -4,7 +4,7 @@ from mcp.server.sse import SseServerTransport
 from starlette.applications import Starlette
 from starlette.requests import Request
 from starlette.routing import Mount, Route
-from pdf2zh import translate_stream
+from pdf2zh import translate_stream_to
 from pdf2zh.doclayout import ModelInstance
 from pathlib import Path
 
@@ -29,10 +29,16 @@ def create_mcp_app() -> FastMCP:
 
         with open(file, "rb") as f:
             file_bytes = f.read()
+        output_path = Path(os.path.dirname(file))
+        filename = os.path.splitext(os.path.basename(file))[0]
+        doc_mono = output_path / f"{filename}-mono.pdf"
+        doc_dual = output_path / f"{filename}-dual.pdf"
         await ctx.log(level="info", message=f"start translate {file}")
         with contextlib.redirect_stdout(io.StringIO()):
-            doc_mono_bytes, doc_dual_bytes = translate_stream(
+            translate_stream_to(
                 file_bytes,
+                mono=doc_mono,
+                dual=doc_dual,
                 lang_in=lang_in,
                 lang_out=lang_out,
                 service="google",
@@ -40,14 +46,6 @@ def create_mcp_app() -> FastMCP:
                 thread=4,
             )
         await ctx.log(level="info", message="translate complete")
-        output_path = Path(os.path.dirname(file))
-        filename = os.path.splitext(os.path.basename(file))[0]
-        doc_mono = output_path / f"{filename}-mono.pdf"
-        doc_dual = output_path / f"{filename}-dual.pdf"
-        with open(doc_mono, "wb") as f:
-            f.write(doc_mono_bytes)
-        with open(doc_dual, "wb") as f:
-            f.write(doc_dual_bytes)
         return f"""------------
     translate complete
     mono pdf file: {doc_mono.absolute()}
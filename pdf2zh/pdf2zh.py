@@ -12,7 +12,12 @@ from string import Template
 from typing import List, Optional
 
 from pdf2zh import __version__, log
-from pdf2zh.high_level import translate, download_remote_fonts
+from pdf2zh.high_level import (
+    OUTPUTS,
+    SAVE_PROFILES,
+    translate,
+    download_remote_fonts,
+)
 from pdf2zh.doclayout import OnnxModel, ModelInstance
 import os
 
@@ -191,6 +196,43 @@ def create_parser() -> argparse.ArgumentParser:
         help="Ignore cache and force retranslation.",
     )
 
+    parse_params.add_argument(
+        "--outputs",
+        type=str,
+        choices=OUTPUTS,
+        default="both",
+        help="Which translated PDF(s) to generate: both, mono or dual.",
+    )
+
+    parse_params.add_argument(
+        "--save-profile",
+        type=str,
+        choices=tuple(SAVE_PROFILES),
+        default="balanced",
+        help="Trade-off between output size and save time: fast, balanced or smallest.",
+    )
+
+    parse_params.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="The number of documents translated concurrently in --dir mode.",
+    )
+
+    parse_params.add_argument(
+        "--resume",
+        action="store_true",
+        help="Record finished pages and resume an interrupted translation.",
+    )
+
+    parse_params.add_argument(
+        "--skip-unchanged",
+        action="store_true",
+        help="Skip files translated by a previous run in --dir mode "
+        "if their content and options are unchanged.",
+    )
+
     parse_params.add_argument(
         "--mcp", action="store_true", help="Launch pdf2zh MCP server in STDIO mode"
     )
@@ -400,6 +442,8 @@ def main(args: Optional[List[str]] = None) -> int:
         translate(model=ModelInstance.value, **vars(parsed_args))
         return 0
 
+    # 单文件翻译不读写清单
+    parsed_args.skip_unchanged = False
     translate(model=ModelInstance.value, **vars(parsed_args))
     return 0
 
@@ -420,10 +464,6 @@ def yadt_main(parsed_args) -> int:
     yadt_init()
     font_path = download_remote_fonts(lang_out.lower())
 
-    param = parsed_args.service.split(":", 1)
-    service_name = param[0]
-    service_model = param[1] if len(param) > 1 else None
-
     envs = {}
     prompt = []
 
@@ -435,69 +475,16 @@ def yadt_main(parsed_args) -> int:
         except Exception:
             raise ValueError("prompt error.")
 
-    from pdf2zh.translator import (
-        AzureOpenAITranslator,
-        GoogleTranslator,
-        BingTranslator,
-        DeepLTranslator,
-        DeepLXTranslator,
-        OllamaTranslator,
-        OpenAITranslator,
-        ZhipuTranslator,
-        ModelScopeTranslator,
-        SiliconTranslator,
-        GeminiTranslator,
-        AzureTranslator,
-        TencentTranslator,
-        DifyTranslator,
-        AnythingLLMTranslator,
-        XinferenceTranslator,
-        ArgosTranslator,
-        GrokTranslator,
-        GroqTranslator,
-        DeepseekTranslator,
-        OpenAIlikedTranslator,
-        QwenMtTranslator,
-        X302AITranslator,
-    )
-
-    for translator in [
-        GoogleTranslator,
-        BingTranslator,
-        DeepLTranslator,
-        DeepLXTranslator,
-        OllamaTranslator,
-        XinferenceTranslator,
-        AzureOpenAITranslator,
-        OpenAITranslator,
-        ZhipuTranslator,
-        ModelScopeTranslator,
-        SiliconTranslator,
-        GeminiTranslator,
-        AzureTranslator,
-        TencentTranslator,
-        DifyTranslator,
-        AnythingLLMTranslator,
-        ArgosTranslator,
-        GrokTranslator,
-        GroqTranslator,
-        DeepseekTranslator,
-        OpenAIlikedTranslator,
-        QwenMtTranslator,
-        X302AITranslator,
-    ]:
-        if service_name == translator.name:
-            translator = translator(
-                lang_in,
-                lang_out,
-                service_model,
-                envs=envs,
-                prompt=prompt,
-                ignore_cache=ignore_cache,
-            )
-            break
-    else:
-        raise ValueError("Unsupported translation service")
+    from pdf2zh.registry import get_translator
+
+    translator = get_translator(
+        parsed_args.service,
+        lang_in,
+        lang_out,
+        envs=envs,
+        prompt=prompt,
+        ignore_cache=ignore_cache,
+    )
     import asyncio
 
     for file in untranlate_file:
@@ -512,8 +499,8 @@ def yadt_main(parsed_args) -> int:
             debug=parsed_args.debug,
             lang_in=lang_in,
             lang_out=lang_out,
-            no_dual=False,
-            no_mono=False,
+            no_dual=parsed_args.outputs == "mono",
+            no_mono=parsed_args.outputs == "dual",
             qps=parsed_args.thread,
         )
 
@@ -1,3 +1,4 @@
+import hashlib
 import logging
 from typing import Any, Dict, Optional, Sequence, Tuple, cast
 import numpy as np
@@ -48,6 +49,41 @@ def safe_float(o: Any) -> Optional[float]:
         return None
 
 
+def page_digest(page: PDFPage) -> Tuple[str, Dict[str, int]]:
+    """Fingerprint a page by its content and the resources it draws.
+
+    Returns the page digest and the digests of the form XObjects on the
+    page, mapped to their object ids.
+    """
+    forms = {}
+
+    def walk(h, resources, streams, visited):
+        for stream in streams:
+            h.update(stream_value(stream).get_data())
+        resources = dict_value(resources)
+        for name, spec in dict_value(resources.get("Font", {})).items():
+            h.update(f"{name}:{dict_value(spec).get('BaseFont')!r}".encode())
+        for name, ref in dict_value(resources.get("XObject", {})).items():
+            xobj = stream_value(ref)
+            objid = getattr(ref, "objid", None)
+            if xobj.get("Subtype") is LITERAL_FORM and objid not in visited:
+                # form 单独计算摘要，其 obj_patch 按摘要缓存
+                fh = hashlib.sha256(
+                    repr((xobj.get("BBox"), xobj.get("Matrix"))).encode()
+                )
+                walk(fh, xobj.get("Resources") or resources, [xobj], visited | {objid})
+                forms[fh.hexdigest()] = objid
+                h.update(f"{name}:{fh.hexdigest()}".encode())
+            else:  # 图片对未解码的原始数据取摘要，避免解码
+                size = [resolve1(xobj.get(k)) for k in ("Width", "Height", "Length")]
+                h.update(f"{name}:{size}".encode())
+                h.update(xobj.get_rawdata() or xobj.get_data())
+
+    h = hashlib.sha256(repr((page.cropbox, page.rotate)).encode())
+    walk(h, page.resources, page.contents, set())
+    return h.hexdigest(), forms
+
+
 class PDFPageInterpreterEx(PDFPageInterpreter):
     """Processor for the content of a PDF page
 
@@ -239,7 +275,7 @@ class PDFPageInterpreterEx(PDFPageInterpreter):
                 a, b, c, d = ctm_inv.reshape(4).tolist()
                 e, f = pos_inv.tolist()[0]
                 self.obj_patch[self.xobjmap[xobjid].objid] = (
-                    f"q {ops_base}Q {a} {b} {c} {d} {e} {f} cm {ops_new}"
+                    f"q {ops_base}Q {a} {b} {c} {d} {e} {f} cm ".encode() + ops_new
                 )
             except Exception:
                 pass
@@ -272,10 +308,10 @@ class PDFPageInterpreterEx(PDFPageInterpreter):
         ops_new = self.device.end_page(page)
         # 上面渲染的时候会根据 cropbox 减掉页面偏移得到真实坐标，这里输出的时候需要用 cm 把页面偏移加回来
         self.obj_patch[page.page_xref] = (
-            f"q {ops_base}Q 1 0 0 1 {x0} {y0} cm {ops_new}"  # ops_base 里可能有图，需要让 ops_new 里的文字覆盖在上面，使用 q/Q 重置位置矩阵
+            f"q {ops_base}Q 1 0 0 1 {x0} {y0} cm ".encode() + ops_new  # ops_base 里可能有图，需要让 ops_new 里的文字覆盖在上面，使用 q/Q 重置位置矩阵
         )
         for obj in page.contents:
-            self.obj_patch[obj.objid] = ""
+            self.obj_patch[obj.objid] = b""
 
     def render_contents(
         self,
@@ -0,0 +1,185 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from string import Template
+from typing import Dict
+
+from pdf2zh.balancer import BalancedTranslator
+from pdf2zh.config import ConfigManager
+from pdf2zh.translator import (
+    AnythingLLMTranslator,
+    ArgosTranslator,
+    AzureOpenAITranslator,
+    AzureTranslator,
+    BaseTranslator,
+    BingTranslator,
+    DeepLTranslator,
+    DeepLXTranslator,
+    DeepseekTranslator,
+    DifyTranslator,
+    GeminiTranslator,
+    GoogleTranslator,
+    GrokTranslator,
+    GroqTranslator,
+    ModelScopeTranslator,
+    OllamaTranslator,
+    OpenAIlikedTranslator,
+    OpenAITranslator,
+    QwenMtTranslator,
+    SiliconTranslator,
+    TencentTranslator,
+    XinferenceTranslator,
+    ZhipuTranslator,
+    X302AITranslator,
+)
+
+# 服务名 -> 翻译器类，SDK 在创建实例时才导入
+translators: Dict[str, type[BaseTranslator]] = {
+    translator.name: translator
+    for translator in [
+        GoogleTranslator,
+        BingTranslator,
+        DeepLTranslator,
+        DeepLXTranslator,
+        OllamaTranslator,
+        XinferenceTranslator,
+        AzureOpenAITranslator,
+        OpenAITranslator,
+        ZhipuTranslator,
+        ModelScopeTranslator,
+        SiliconTranslator,
+        GeminiTranslator,
+        AzureTranslator,
+        TencentTranslator,
+        DifyTranslator,
+        AnythingLLMTranslator,
+        ArgosTranslator,
+        GrokTranslator,
+        GroqTranslator,
+        DeepseekTranslator,
+        OpenAIlikedTranslator,
+        QwenMtTranslator,
+        X302AITranslator,
+    ]
+}
+
+# (服务, 语言, 环境变量, 提示词, 缓存开关) -> 翻译器实例，按最近使用淘汰
+translator_pool: OrderedDict[tuple, BaseTranslator] = OrderedDict()
+# 同样的键，但只对应单个服务，值为该服务每个端点一个的翻译器
+endpoint_pool: OrderedDict[tuple, list[BaseTranslator]] = OrderedDict()
+translator_pool_lock = threading.Lock()
+POOL_SIZE = 32  # 每个池保留的配置数，长期运行的 GUI 和 Celery 进程中不会无限增长
+
+
+def get_translator_class(name: str) -> type[BaseTranslator]:
+    try:
+        return translators[name]
+    except KeyError:
+        raise ValueError("Unsupported translation service") from None
+
+
+def resolve_envs(name: str, envs: Dict) -> dict:
+    """
+    Return the env values a new translator of the service would use,
+    in the order of BaseTranslator.set_envs: config file, environment, envs.
+    """
+    translator = get_translator_class(name.strip().split(":", 1)[0])
+    values = dict(
+        ConfigManager.get_translator_by_name(translator.name) or translator.envs
+    )
+    values.update({k: os.environ[k] for k in values if k in os.environ})
+    values.update(envs or {})
+    return values
+
+
+def pool_key(service, lang_in, lang_out, envs, prompt, ignore_cache) -> tuple:
+    # 环境变量或配置文件变化后重新创建翻译器，不会沿用旧的地址和密钥
+    resolved = [resolve_envs(name, envs) for name in service.split(",")]
+    return (
+        service,
+        lang_in,
+        lang_out,
+        json.dumps(resolved, sort_keys=True, default=str),
+        prompt.template if isinstance(prompt, Template) else None,
+        ignore_cache,
+    )
+
+
+def pool_get(pool: OrderedDict, key: tuple):
+    with translator_pool_lock:
+        if key in pool:
+            pool.move_to_end(key)
+            return pool[key]
+    return None
+
+
+def pool_put(pool: OrderedDict, key: tuple, value):
+    """Add value unless another thread added one first, return the pooled value"""
+    with translator_pool_lock:
+        value = pool.setdefault(key, value)
+        pool.move_to_end(key)
+        while len(pool) > POOL_SIZE:
+            pool.popitem(last=False)
+        return value
+
+
+def create_translators(
+    name: str,
+    lang_in: str,
+    lang_out: str,
+    envs: Dict = None,
+    prompt: Template = None,
+    ignore_cache: bool = False,
+) -> list[BaseTranslator]:
+    """
+    Return the pooled translators of one service, one per endpoint.
+    :param name: service name with an optional model, e.g. "ollama:gemma2:9b"
+    """
+    # e.g. "ollama:gemma2:9b" -> ["ollama", "gemma2:9b"]
+    param = name.strip().split(":", 1)
+    translator = get_translator_class(param[0])
+    model = param[1] if len(param) > 1 else None
+    key = pool_key(name.strip(), lang_in, lang_out, envs, prompt, ignore_cache)
+    if (members := pool_get(endpoint_pool, key)) is not None:
+        return members
+    members = translator.create_per_endpoint(
+        lang_in, lang_out, model, envs=envs, prompt=prompt, ignore_cache=ignore_cache
+    )
+    return pool_put(endpoint_pool, key, members)
+
+
+def get_translator(
+    service: str,
+    lang_in: str,
+    lang_out: str,
+    envs: Dict = None,
+    prompt: Template = None,
+    ignore_cache: bool = False,
+) -> BaseTranslator:
+    """
+    Return a translator for a service string, shared by every caller with the same
+    settings so that HTTP clients, connection pools and the cache survive across
+    documents.
+    :param service: comma separated services, e.g. "ollama:gemma2,openai"
+    """
+    envs = envs or {}
+    key = pool_key(service, lang_in, lang_out, envs, prompt, ignore_cache)
+    if (translator := pool_get(translator_pool, key)) is not None:
+        return translator
+    members: list[BaseTranslator] = []
+    services = service.split(",")
+    for name in services:
+        service_envs = envs
+        if len(services) > 1:  # 多个服务时各自只取自己的环境变量
+            service_envs = {
+                k: v
+                for k, v in envs.items()
+                if k in get_translator_class(name.strip().split(":", 1)[0]).envs
+            }
+        members += create_translators(
+            name, lang_in, lang_out, service_envs, prompt, ignore_cache
+        )
+    # 多个端点或服务时由负载均衡器分发请求并在失败时切换
+    translator = members[0] if len(members) == 1 else BalancedTranslator(members)
+    return pool_put(translator_pool, key, translator)
@@ -1,47 +1,260 @@
+import asyncio
+import atexit
+import bisect
 import html
+import importlib
+import importlib.util
 import json
 import logging
 import os
 import re
+import threading
+import time
 import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor
 from copy import copy
 from string import Template
 from typing import cast
-import deepl
-import ollama
-import openai
 import requests
-import xinference_client
-from azure.ai.translation.text import TextTranslationClient
-from azure.core.credentials import AzureKeyCredential
-from tencentcloud.common import credential
-from tencentcloud.tmt.v20180321.models import (
-    TextTranslateRequest,
-    TextTranslateResponse,
-)
-from tencentcloud.tmt.v20180321.tmt_client import TmtClient
+from requests.adapters import HTTPAdapter
 
 from pdf2zh.cache import TranslationCache
 from pdf2zh.config import ConfigManager
+from pdf2zh.hedging import get_hedger
+from pdf2zh.limiter import get_limiter, retry_after
 
+logger = logging.getLogger(__name__)
 
-from tenacity import retry, retry_if_exception_type
-from tenacity import stop_after_attempt
-from tenacity import wait_exponential
 
+class LazyModule:
+    """A module imported on first attribute access"""
 
-logger = logging.getLogger(__name__)
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return getattr(self._module, attr)
+
+
+# 各服务的 SDK 在首次使用时才导入，避免 import pdf2zh 时加载全部依赖
+httpx = LazyModule("httpx")
+deepl = LazyModule("deepl")
+ollama = LazyModule("ollama")
+openai = LazyModule("openai")
+xinference_client = LazyModule("xinference_client")
+text_translation = LazyModule("azure.ai.translation.text")
+azure_credentials = LazyModule("azure.core.credentials")
+tencent_credential = LazyModule("tencentcloud.common.credential")
+tmt_models = LazyModule("tencentcloud.tmt.v20180321.models")
+tmt_client = LazyModule("tencentcloud.tmt.v20180321.tmt_client")
+
+# 所有翻译器共用的连接池参数，可在配置 HTTP_POOL 中覆盖
+HTTP_POOL = {
+    "hosts": 10,  # 缓存连接池的主机数
+    "maxsize": 100,  # 每个主机保留的空闲连接数，应不小于线程数
+    "keepalive_expiry": 30,  # 异步客户端空闲连接的保留秒数
+    "http2": False,  # 异步客户端使用 HTTP/2，需要安装 h2
+}
+
+http_adapter: HTTPAdapter = None
+http_adapter_lock = threading.Lock()
+
+
+def http_pool_config() -> dict:
+    config = ConfigManager.get("HTTP_POOL") or {}
+    if isinstance(config, str):  # 来自环境变量
+        config = json.loads(config)
+    return {**HTTP_POOL, **config}
+
+
+def http_session() -> requests.Session:
+    """
+    Return a new session on the connection pool shared by all translators, so that
+    connections and TLS sessions are reused across translators and documents.
+    Each session keeps its own cookies and headers.
+    """
+    global http_adapter
+    with http_adapter_lock:
+        if http_adapter is None:
+            config = http_pool_config()
+            # requests 默认每个主机只保留 10 个连接，线程更多时多余的连接用完即关闭
+            http_adapter = HTTPAdapter(
+                pool_connections=config["hosts"], pool_maxsize=config["maxsize"]
+            )
+    session = requests.Session()
+    session.mount("http://", http_adapter)
+    session.mount("https://", http_adapter)
+    return session
+
+
+def async_http_limits():
+    config = http_pool_config()
+    # 异步 HTTP 客户端的连接上限，单个事件循环上可同时发出数百个请求
+    return httpx.Limits(
+        max_connections=1000,
+        max_keepalive_connections=config["maxsize"],
+        keepalive_expiry=config["keepalive_expiry"],
+    )
+
+
+# verify -> 异步 HTTP 客户端，只在翻译器事件循环上使用
+async_http_clients = {}
+
+
+def async_http_client(verify: bool = True):
+    """
+    Return the async HTTP client shared by all translators, so that connections and
+    TLS sessions are reused across translators and documents.
+    It must only be used on the translator event loop, see translator_loop.
+    """
+    with http_adapter_lock:
+        if verify not in async_http_clients:
+            async_http_clients[verify] = httpx.AsyncClient(
+                limits=async_http_limits(),
+                http2=async_http2(),
+                follow_redirects=True,
+                verify=verify,
+            )
+        return async_http_clients[verify]
+
+
+def async_http2() -> bool:
+    if not http_pool_config()["http2"]:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("HTTP/2 requires the h2 package, falling back to HTTP/1.1")
+        return False
+    return True
+
+
+# 所有翻译器的请求都在这个事件循环上执行，同步调用在其中运行并等待结果
+event_loop: asyncio.AbstractEventLoop = None
+event_loop_lock = threading.Lock()
+# 没有原生异步客户端的翻译器在此线程池中运行同步请求
+EVENT_LOOP_WORKERS = 256
+
+
+def translator_loop() -> asyncio.AbstractEventLoop:
+    """Return the event loop running the requests of all translators, started on first use"""
+    global event_loop
+    with event_loop_lock:
+        if event_loop is None:
+            event_loop = asyncio.new_event_loop()
+            event_loop.set_default_executor(
+                ThreadPoolExecutor(
+                    max_workers=EVENT_LOOP_WORKERS, thread_name_prefix="pdf2zh-request"
+                )
+            )
+            threading.Thread(
+                target=event_loop.run_forever, name="pdf2zh-async", daemon=True
+            ).start()
+        return event_loop
+
+
+def submit_async(coro) -> Future:
+    """Schedule a coroutine on the translator event loop, cancelling the returned
+    future cancels the coroutine"""
+    return asyncio.run_coroutine_threadsafe(coro, translator_loop())
+
+
+def run_async(coro):
+    """Run a coroutine on the translator event loop and wait for its result"""
+    return submit_async(coro).result()
+
+
+async def close_async_http_clients():
+    for client in async_http_clients.values():
+        await client.aclose()
+    async_http_clients.clear()
+
+
+@atexit.register
+def close_translator_loop():
+    """Close the async clients, then stop the translator event loop"""
+    global event_loop
+    with event_loop_lock:
+        loop, event_loop = event_loop, None
+    if loop is None:
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(close_async_http_clients(), loop).result(5)
+    except Exception:
+        logger.warning("Failed to close the async HTTP clients", exc_info=True)
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def forget_translator_loop():
+    # fork 出的子进程中没有事件循环线程，也不能使用父进程的连接
+    global event_loop, event_loop_lock
+    event_loop = None
+    event_loop_lock = threading.Lock()
+    async_http_clients.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=forget_translator_loop)
 
 
 def remove_control_characters(s):
     return "".join(ch for ch in s if unicodedata.category(ch)[0] != "C")
 
 
+PLACEHOLDER = re.compile(r"\{\s*v[\d\s]+\}", re.IGNORECASE)  # 公式标记 {vn}，不能拆开
+# 英文句末需要跟着空白，避免拆开小数和缩写
+SENTENCE_END = re.compile(r"[.!?;:]\s+|[。！？；：]\s*")
+
+
+def split_text(text: str, size: int) -> list[str]:
+    """
+    Split text into chunks of at most size characters, at sentence ends if possible,
+    then at whitespace, never inside a formula placeholder.
+    Whitespace stays at the end of the chunks, so "".join(chunks) == text.
+    """
+    if len(text) <= size:
+        return [text]
+    placeholders = [m.span() for m in PLACEHOLDER.finditer(text)]
+
+    def inside(pos: int):
+        for start, end in placeholders:
+            if start < pos < end:
+                return start, end
+        return None
+
+    sentence_ends = [
+        m.end() for m in SENTENCE_END.finditer(text) if not inside(m.end())
+    ]
+    spaces = [m.end() for m in re.finditer(r"\s+", text) if not inside(m.end())]
+    chunks = []
+    start = 0
+    while len(text) - start > size:
+        limit = start + size
+        for cuts in (sentence_ends, spaces):
+            i = bisect.bisect_right(cuts, limit) - 1
+            if i >= 0 and cuts[i] > start:
+                cut = cuts[i]
+                break
+        else:  # 没有句末和空白时在上限处切开，但不拆开公式标记
+            cut = limit
+            if span := inside(cut):
+                cut = span[0] if span[0] > start else span[1]
+        chunks.append(text[start:cut])
+        start = cut
+    chunks.append(text[start:])
+    return chunks
+
+
 class BaseTranslator:
     name = "base"
     envs = {}
     lang_map: dict[str, str] = {}
     CustomPrompt = False
+    endpoint_env: str | None = None  # 可以填写逗号分隔的多个地址的环境变量
+    timeout = (10, 60)  # (连接, 读取) 超时秒数，可在配置 TIMEOUTS 中按服务覆盖
+    # 单次请求的最大字符数，过长的段落会被切开，可在配置 CHUNK_SIZES 中按服务覆盖
+    chunk_size: int | None = None
 
     def __init__(self, lang_in: str, lang_out: str, model: str, ignore_cache: bool):
         lang_in = self.lang_map.get(lang_in.lower(), lang_in)
@@ -50,6 +263,20 @@ class BaseTranslator:
         self.lang_out = lang_out
         self.model = model
         self.ignore_cache = ignore_cache
+        timeouts = ConfigManager.get("TIMEOUTS") or {}
+        if isinstance(timeouts, str):  # 来自环境变量
+            timeouts = json.loads(timeouts)
+        timeout = timeouts.get(self.name, {})
+        self.timeout = (
+            timeout.get("connect", self.timeout[0]),
+            timeout.get("read", self.timeout[1]),
+        )
+        chunk_sizes = ConfigManager.get("CHUNK_SIZES") or {}
+        if isinstance(chunk_sizes, str):  # 来自环境变量
+            chunk_sizes = json.loads(chunk_sizes)
+        self.chunk_size = chunk_sizes.get(self.name, self.chunk_size)
+        self.limiter = get_limiter(self.name)  # 同一服务的所有文档共享限流状态
+        self.hedger = get_hedger(self.name)  # 未配置时为 None，不发出副本请求
 
         self.cache = TranslationCache(
             self.name,
@@ -79,6 +306,31 @@ class BaseTranslator:
                 self.envs[key] = envs[key]
             ConfigManager.set_translator_by_name(self.name, self.envs)
 
+    @classmethod
+    def create_per_endpoint(cls, lang_in, lang_out, model, envs=None, **kwargs):
+        """
+        Create one translator per endpoint when endpoint_env holds a comma separated list,
+        e.g. OLLAMA_HOST="http://host1:11434,http://host2:11434".
+        :return: list of translators
+        """
+        envs = envs or {}
+        key = cls.endpoint_env
+        value = None
+        if key in cls.envs:
+            config = ConfigManager.get_translator_by_name(cls.name) or {}
+            value = envs.get(key) or os.environ.get(key) or config.get(key)
+        if not value or "," not in value:
+            return [cls(lang_in, lang_out, model, envs=envs, **kwargs)]
+        translators = [
+            cls(lang_in, lang_out, model, envs={**envs, key: url.strip()}, **kwargs)
+            for url in value.split(",")
+        ]
+        # 每个成员都会把自己的地址写入配置文件，恢复为完整列表
+        ConfigManager.set_translator_by_name(
+            cls.name, {**translators[-1].envs, key: value}
+        )
+        return translators
+
     def add_cache_impact_parameters(self, k: str, v):
         """
         Add parameters that affect the translation quality to distinguish the translation effects under different parameters.
@@ -87,28 +339,94 @@ class BaseTranslator:
         """
         self.cache.add_params(k, v)
 
+    def cache_params(self) -> dict:
+        """Return the engine and the parameters that affect its translations"""
+        return {
+            "translate_engine": self.cache.translate_engine,
+            "translate_engine_params": self.cache.translate_engine_params,
+        }
+
     def translate(self, text: str, ignore_cache: bool = False) -> str:
         """
         Translate the text, and the other part should call this method.
+        Runs atranslate on the translator event loop and waits for the result.
+        :param text: text to translate
+        :return: translated text
+        """
+        return run_async(self.atranslate(text, ignore_cache))
+
+    def split(self, text: str) -> list[str]:
+        """Split a paragraph longer than chunk_size, see split_text"""
+        if not self.chunk_size:
+            return [text]
+        return split_text(text, self.chunk_size)
+
+    def join(self, chunks: list[str], translations) -> str:
+        # 保留原文各块之间的空白
+        return "".join(
+            translation + chunk[len(chunk.rstrip()) :]
+            for chunk, translation in zip(chunks, translations)
+        )
+
+    async def hedged_translate(self, text: str) -> str:
+        # 只对冲请求本身：限流等待不计入耗时样本，被限流时也不会发出副本
+        if self.hedger:
+            return await self.hedger.acall(self.ado_translate, text)
+        return await self.ado_translate(text)
+
+    def do_translate(self, text: str) -> str:
+        """
+        Actual translate text, override this method or ado_translate
+        :param text: text to translate
+        :return: translated text
+        """
+        if type(self).ado_translate is BaseTranslator.ado_translate:
+            raise NotImplementedError
+        return run_async(self.ado_translate(text))
+
+    async def atranslate(self, text: str, ignore_cache: bool = False) -> str:
+        """
+        Translate the text asynchronously, many calls can run concurrently on one event loop.
         :param text: text to translate
         :return: translated text
         """
+        loop = translator_loop()
+        if asyncio.get_running_loop() is not loop:
+            # 异步客户端只能在翻译器事件循环上使用，其他事件循环上的调用转交过去
+            return await asyncio.wrap_future(
+                asyncio.run_coroutine_threadsafe(
+                    self.atranslate(text, ignore_cache), loop
+                )
+            )
+        # 缓存读写是阻塞的 SQLite 调用，放到线程中执行以免阻塞事件循环
         if not (self.ignore_cache or ignore_cache):
-            cache = self.cache.get(text)
+            cache = await asyncio.to_thread(self.cache.get, text)
             if cache is not None:
                 return cache
 
-        translation = self.do_translate(text)
-        self.cache.set(text, translation)
+        chunks = self.split(text)
+        if len(chunks) > 1:
+            translations = await asyncio.gather(
+                *[self.atranslate(chunk.rstrip(), ignore_cache) for chunk in chunks]
+            )
+            translation = self.join(chunks, translations)
+        else:
+            translation = await self.limiter.acall(self.hedged_translate, text)
+        await asyncio.to_thread(self.cache.set, text, translation)
         return translation
 
-    def do_translate(self, text: str) -> str:
+    async def ado_translate(self, text: str) -> str:
         """
-        Actual translate text, override this method
+        Actual translate text asynchronously on the translator event loop, override this
+        method with a native async client. By default do_translate runs in a worker thread.
         :param text: text to translate
         :return: translated text
         """
-        raise NotImplementedError
+        return await asyncio.to_thread(self.do_translate, text)
+
+    @property
+    def http_timeout(self):
+        return httpx.Timeout(self.timeout[1], connect=self.timeout[0])
 
     def prompt(
         self, text: str, prompt_template: Template | None = None
@@ -167,21 +485,22 @@ class BaseTranslator:
 class GoogleTranslator(BaseTranslator):
     name = "google"
     lang_map = {"zh": "zh-CN"}
+    chunk_size = 5000  # google translate max length
 
     def __init__(self, lang_in, lang_out, model, ignore_cache=False, **kwargs):
         super().__init__(lang_in, lang_out, model, ignore_cache)
-        self.session = requests.Session()
+        self.client = async_http_client()
         self.endpoint = "https://translate.google.com/m"
         self.headers = {
             "User-Agent": "Mozilla/4.0 (compatible;MSIE 6.0;Windows NT 5.1;SV1;.NET CLR 1.1.4322;.NET CLR 2.0.50727;.NET CLR 3.0.04506.30)"  # noqa: E501
         }
 
-    def do_translate(self, text):
-        text = text[:5000]  # google translate max length
-        response = self.session.get(
+    async def ado_translate(self, text):
+        response = await self.client.get(
             self.endpoint,
             params={"tl": self.lang_out, "sl": self.lang_in, "q": text},
             headers=self.headers,
+            timeout=self.http_timeout,
         )
         re_result = re.findall(
             r'(?s)class="(?:t0|result-container)">(.*?)<', response.text
@@ -198,42 +517,75 @@ class BingTranslator(BaseTranslator):
     # https://github.com/immersive-translate/old-immersive-translate/blob/6df13da22664bea2f51efe5db64c63aca59c4e79/src/background/translationService.js
     name = "bing"
     lang_map = {"zh": "zh-Hans"}
+    chunk_size = 1000  # bing translate max length
+    sid_ttl = 600  # 页面未给出 token 有效期时的默认值（秒）
 
     def __init__(self, lang_in, lang_out, model, ignore_cache=False, **kwargs):
         super().__init__(lang_in, lang_out, model, ignore_cache)
-        self.session = requests.Session()
+        self.client = async_http_client()
         self.endpoint = "https://www.bing.com/translator"
         self.headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/131.0.0.0 Safari/537.36 Edg/131.0.0.0",  # noqa: E501
         }
+        # (url, ig, iid, key, token) 在所有请求间共享，过期或请求失败时才重新获取
+        self.sid = None
+        self.sid_expire = 0.0
+        self.sid_lock = asyncio.Lock()
 
-    def find_sid(self):
-        response = self.session.get(self.endpoint)
+    async def find_sid(self):
+        response = await self.client.get(self.endpoint, timeout=self.http_timeout)
         response.raise_for_status()
-        url = response.url[:-10]
+        return self.parse_sid(response)
+
+    def parse_sid(self, response):
+        url = str(response.url)[:-10]
         ig = re.findall(r"\"ig\":\"(.*?)\"", response.text)[0]
         iid = re.findall(r"data-iid=\"(.*?)\"", response.text)[-1]
-        key, token = re.findall(
-            r"params_AbusePreventionHelper\s=\s\[(.*?),\"(.*?)\",", response.text
+        key, token, ttl = re.findall(
+            r"params_AbusePreventionHelper\s=\s\[(.*?),\"(.*?)\",(\d*)", response.text
         )[0]
-        return url, ig, iid, key, token
+        # 提前一分钟视为过期，避免请求途中失效
+        ttl = int(ttl) / 1000 if ttl else self.sid_ttl
+        self.sid_expire = time.monotonic() + max(ttl - 60, ttl / 2)
+        self.sid = url, ig, iid, key, token
+        return self.sid
+
+    async def get_sid(self, stale=None):
+        """Return the cached sid, fetch a new one if expired or equal to the stale one"""
+        async with self.sid_lock:
+            if (
+                self.sid is None
+                or self.sid is stale
+                or time.monotonic() > self.sid_expire
+            ):
+                await self.find_sid()
+            return self.sid
+
+    def translate_request(self, sid, text):
+        url, ig, iid, key, token = sid
+        return f"{url}ttranslatev3?IG={ig}&IID={iid}", {
+            "fromLang": self.lang_in,
+            "to": self.lang_out,
+            "text": text,
+            "token": token,
+            "key": key,
+        }
 
-    def do_translate(self, text):
-        text = text[:1000]  # bing translate max length
-        url, ig, iid, key, token = self.find_sid()
-        response = self.session.post(
-            f"{url}ttranslatev3?IG={ig}&IID={iid}",
-            data={
-                "fromLang": self.lang_in,
-                "to": self.lang_out,
-                "text": text,
-                "token": token,
-                "key": key,
-            },
-            headers=self.headers,
-        )
-        response.raise_for_status()
-        return response.json()[0]["translations"][0]["text"]
+    async def ado_translate(self, text):
+        sid = await self.get_sid()
+        for attempt in range(2):
+            url, data = self.translate_request(sid, text)
+            try:
+                response = await self.client.post(
+                    url, data=data, headers=self.headers, timeout=self.http_timeout
+                )
+                response.raise_for_status()
+                return response.json()[0]["translations"][0]["text"]
+            except (httpx.HTTPError, ValueError, LookupError) as e:
+                # 限流交给限流器处理，其余错误视为 token 失效，重新获取后再试一次
+                if attempt or retry_after(e) is not None:
+                    raise
+                sid = await self.get_sid(stale=sid)
 
 
 class DeepLTranslator(BaseTranslator):
@@ -267,6 +619,7 @@ class DeepLXTranslator(BaseTranslator):
         "DEEPLX_ACCESS_TOKEN": None,
     }
     lang_map = {"zh": "zh-Hans"}
+    endpoint_env = "DEEPLX_ENDPOINT"
 
     def __init__(
         self, lang_in, lang_out, model, envs=None, ignore_cache=False, **kwargs
@@ -274,20 +627,20 @@ class DeepLXTranslator(BaseTranslator):
         self.set_envs(envs)
         super().__init__(lang_in, lang_out, model, ignore_cache)
         self.endpoint = self.envs["DEEPLX_ENDPOINT"]
-        self.session = requests.Session()
+        self.client = async_http_client(verify=False)
         auth_key = self.envs["DEEPLX_ACCESS_TOKEN"]
         if auth_key:
             self.endpoint = f"{self.endpoint}?token={auth_key}"
 
-    def do_translate(self, text):
-        response = self.session.post(
+    async def ado_translate(self, text):
+        response = await self.client.post(
             self.endpoint,
             json={
                 "source_lang": self.lang_in,
                 "target_lang": self.lang_out,
                 "text": text,
             },
-            verify=False,  # noqa: S506
+            timeout=self.http_timeout,
         )
         response.raise_for_status()
         return response.json()["data"]
@@ -296,11 +649,14 @@ class DeepLXTranslator(BaseTranslator):
 class OllamaTranslator(BaseTranslator):
     # https://github.com/ollama/ollama-python
     name = "ollama"
+    timeout = (10, 300)  # 大模型生成较长段落耗时较久
+    chunk_size = 4000  # 过长的段落容易超出输出长度上限
     envs = {
         "OLLAMA_HOST": "http://127.0.0.1:11434",
         "OLLAMA_MODEL": "gemma2",
     }
     CustomPrompt = True
+    endpoint_env = "OLLAMA_HOST"
 
     def __init__(
         self,
@@ -319,15 +675,20 @@ class OllamaTranslator(BaseTranslator):
             "temperature": 0,  # 随机采样可能会打断公式标记
             "num_predict": 2000,
         }
-        self.client = ollama.Client(host=self.envs["OLLAMA_HOST"])
+        # 异步客户端在事件循环上等待响应，不占用执行器线程
+        self.client = ollama.AsyncClient(
+            host=self.envs["OLLAMA_HOST"],
+            timeout=self.http_timeout,
+            limits=async_http_limits(),
+        )
         self.prompt_template = prompt
         self.add_cache_impact_parameters("temperature", self.options["temperature"])
 
-    def do_translate(self, text: str) -> str:
+    async def ado_translate(self, text: str) -> str:
         if (max_token := len(text) * 5) > self.options["num_predict"]:
             self.options["num_predict"] = max_token
 
-        response = self.client.chat(
+        response = await self.client.chat(
             model=self.model,
             messages=self.prompt(text, self.prompt_template),
             options=self.options,
@@ -353,6 +714,7 @@ class XinferenceTranslator(BaseTranslator):
         "XINFERENCE_MODEL": "gemma-2-it",
     }
     CustomPrompt = True
+    endpoint_env = "XINFERENCE_HOST"
 
     def __init__(
         self, lang_in, lang_out, model, envs=None, prompt=None, ignore_cache=False
@@ -399,12 +761,15 @@ class XinferenceTranslator(BaseTranslator):
 class OpenAITranslator(BaseTranslator):
     # https://github.com/openai/openai-python
     name = "openai"
+    timeout = (10, 300)
+    chunk_size = 4000
     envs = {
         "OPENAI_BASE_URL": "https://api.openai.com/v1",
         "OPENAI_API_KEY": None,
         "OPENAI_MODEL": "gpt-4o-mini",
     }
     CustomPrompt = True
+    endpoint_env = "OPENAI_BASE_URL"
 
     def __init__(
         self,
@@ -422,9 +787,11 @@ class OpenAITranslator(BaseTranslator):
             model = self.envs["OPENAI_MODEL"]
         super().__init__(lang_in, lang_out, model, ignore_cache)
         self.options = {"temperature": 0}  # 随机采样可能会打断公式标记
-        self.client = openai.OpenAI(
+        self.client = openai.AsyncOpenAI(
             base_url=base_url or self.envs["OPENAI_BASE_URL"],
             api_key=api_key or self.envs["OPENAI_API_KEY"],
+            timeout=self.http_timeout,
+            http_client=async_http_client(),
         )
         self.prompttext = prompt
         self.add_cache_impact_parameters("temperature", self.options["temperature"])
@@ -433,17 +800,8 @@ class OpenAITranslator(BaseTranslator):
         self.add_cache_impact_parameters("think_filter_regex", think_filter_regex)
         self.think_filter_regex = re.compile(think_filter_regex, flags=re.DOTALL)
 
-    @retry(
-        retry=retry_if_exception_type(openai.RateLimitError),
-        stop=stop_after_attempt(100),
-        wait=wait_exponential(multiplier=1, min=1, max=15),
-        before_sleep=lambda retry_state: logger.warning(
-            f"RateLimitError, retrying in {retry_state.next_action.sleep} seconds... "
-            f"(Attempt {retry_state.attempt_number}/100)"
-        ),
-    )
-    def do_translate(self, text) -> str:
-        response = self.client.chat.completions.create(
+    async def ado_translate(self, text) -> str:
+        response = await self.client.chat.completions.create(
             model=self.model,
             **self.options,
             messages=self.prompt(text, self.prompttext),
@@ -467,6 +825,7 @@ class OpenAITranslator(BaseTranslator):
 
 class AzureOpenAITranslator(BaseTranslator):
     name = "azure-openai"
+    timeout = (10, 300)
     envs = {
         "AZURE_OPENAI_BASE_URL": None,  # e.g. "https://xxx.openai.azure.com"
         "AZURE_OPENAI_API_KEY": None,
@@ -495,18 +854,20 @@ class AzureOpenAITranslator(BaseTranslator):
             api_key = self.envs["AZURE_OPENAI_API_KEY"]
         super().__init__(lang_in, lang_out, model, ignore_cache)
         self.options = {"temperature": 0}
-        self.client = openai.AzureOpenAI(
+        self.client = openai.AsyncAzureOpenAI(
             azure_endpoint=base_url,
             azure_deployment=model,
             api_version=api_version,
             api_key=api_key,
+            timeout=self.http_timeout,
+            http_client=async_http_client(),
         )
         self.prompttext = prompt
         self.add_cache_impact_parameters("temperature", self.options["temperature"])
         self.add_cache_impact_parameters("prompt", self.prompt("", self.prompttext))
 
-    def do_translate(self, text) -> str:
-        response = self.client.chat.completions.create(
+    async def ado_translate(self, text) -> str:
+        response = await self.client.chat.completions.create(
             model=self.model,
             **self.options,
             messages=self.prompt(text, self.prompttext),
@@ -579,9 +940,9 @@ class ZhipuTranslator(OpenAITranslator):
         self.prompttext = prompt
         self.add_cache_impact_parameters("prompt", self.prompt("", self.prompttext))
 
-    def do_translate(self, text) -> str:
+    async def ado_translate(self, text) -> str:
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 **self.options,
                 messages=self.prompt(text, self.prompttext),
@@ -699,8 +1060,8 @@ class AzureTranslator(BaseTranslator):
         super().__init__(lang_in, lang_out, model, ignore_cache)
         endpoint = self.envs["AZURE_ENDPOINT"]
         api_key = self.envs["AZURE_API_KEY"]
-        credential = AzureKeyCredential(api_key)
-        self.client = TextTranslationClient(
+        credential = azure_credentials.AzureKeyCredential(api_key)
+        self.client = text_translation.TextTranslationClient(
             endpoint=endpoint, credential=credential, region="chinaeast2"
         )
         # https://github.com/Azure/azure-sdk-for-python/issues/9422
@@ -731,26 +1092,27 @@ class TencentTranslator(BaseTranslator):
         self.set_envs(envs)
         super().__init__(lang_in, lang_out, model)
         try:
-            cred = credential.DefaultCredentialProvider().get_credential()
+            cred = tencent_credential.DefaultCredentialProvider().get_credential()
         except EnvironmentError:
-            cred = credential.Credential(
+            cred = tencent_credential.Credential(
                 self.envs["TENCENTCLOUD_SECRET_ID"],
                 self.envs["TENCENTCLOUD_SECRET_KEY"],
             )
-        self.client = TmtClient(cred, "ap-beijing")
-        self.req = TextTranslateRequest()
+        self.client = tmt_client.TmtClient(cred, "ap-beijing")
+        self.req = tmt_models.TextTranslateRequest()
         self.req.Source = self.lang_in
         self.req.Target = self.lang_out
         self.req.ProjectId = 0
 
     def do_translate(self, text):
         self.req.SourceText = text
-        resp: TextTranslateResponse = self.client.TextTranslate(self.req)
+        resp = self.client.TextTranslate(self.req)
         return resp.TargetText
 
 
 class AnythingLLMTranslator(BaseTranslator):
     name = "anythingllm"
+    timeout = (10, 300)
     envs = {
         "AnythingLLM_URL": None,
         "AnythingLLM_APIKEY": None,
@@ -770,6 +1132,7 @@ class AnythingLLMTranslator(BaseTranslator):
             "Content-Type": "application/json",
         }
         self.prompttext = prompt
+        self.session = http_session()
 
     def do_translate(self, text):
         messages = self.prompt(text, self.prompttext)
@@ -779,8 +1142,11 @@ class AnythingLLMTranslator(BaseTranslator):
             "sessionId": "translation_expert",
         }
 
-        response = requests.post(
-            self.api_url, headers=self.headers, data=json.dumps(payload)
+        response = self.session.post(
+            self.api_url,
+            headers=self.headers,
+            data=json.dumps(payload),
+            timeout=self.timeout,
         )
         response.raise_for_status()
         data = response.json()
@@ -791,6 +1157,7 @@ class AnythingLLMTranslator(BaseTranslator):
 
 class DifyTranslator(BaseTranslator):
     name = "dify"
+    timeout = (10, 300)
     envs = {
         "DIFY_API_URL": None,  # 填写实际 Dify API 地址
         "DIFY_API_KEY": None,  # 替换为实际 API 密钥
@@ -803,6 +1170,7 @@ class DifyTranslator(BaseTranslator):
         super().__init__(lang_out, lang_in, model, ignore_cache)
         self.api_url = self.envs["DIFY_API_URL"]
         self.api_key = self.envs["DIFY_API_KEY"]
+        self.session = http_session()
 
     def do_translate(self, text):
         headers = {
@@ -821,8 +1189,11 @@ class DifyTranslator(BaseTranslator):
         }
 
         # 向 Dify 服务器发送请求
-        response = requests.post(
-            self.api_url, headers=headers, data=json.dumps(payload)
+        response = self.session.post(
+            self.api_url,
+            headers=headers,
+            data=json.dumps(payload),
+            timeout=self.timeout,
         )
         response.raise_for_status()
         response_data = response.json()
@@ -882,6 +1253,9 @@ class ArgosTranslator(BaseTranslator):
         translatedText = translation.translate(text)
         return translatedText
 
+    async def atranslate(self, text: str, ignore_cache: bool = False):
+        return await asyncio.to_thread(self.translate, text, ignore_cache)
+
 
 class GrokTranslator(OpenAITranslator):
     # https://docs.x.ai/docs/overview#getting-started
@@ -1059,7 +1433,7 @@ class QwenMtTranslator(OpenAITranslator):
 
         return langdict[input_lang]
 
-    def do_translate(self, text) -> str:
+    async def ado_translate(self, text) -> str:
         """
         Qwen-MT Model reqeust to send translation_options to the server.
         domains are options, but suggested. it must be in English.
@@ -1069,7 +1443,7 @@ class QwenMtTranslator(OpenAITranslator):
             "target_lang": self.lang_mapping(self.lang_out),
             "domains": self.envs["ALI_DOMAINS"],
         }
-        response = self.client.chat.completions.create(
+        response = await self.client.chat.completions.create(
             model=self.model,
             **self.options,
             messages=[{"role": "user", "content": text}],
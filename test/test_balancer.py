@@ -0,0 +1,135 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pdf2zh import cache
+from pdf2zh.balancer import BalancedTranslator
+from pdf2zh.translator import DeepLXTranslator
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, status=200, delay=0.0):
+        self.status = status
+        self.delay = delay
+        self.requests = 0
+        super().__init__(("127.0.0.1", 0), StubDeepLXHandler)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_port}"
+
+
+class StubDeepLXHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        self.server.requests += 1
+        time.sleep(self.server.delay)
+        data = json.dumps({"data": body["text"].upper()}).encode()
+        self.send_response(self.server.status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestBalancedTranslator(unittest.TestCase):
+    def setUp(self):
+        self.test_db = cache.init_test_db()
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        cache.clean_test_db(self.test_db)
+
+    def balanced(self, *servers):
+        self.servers += servers
+        translators = DeepLXTranslator.create_per_endpoint(
+            "en",
+            "zh",
+            None,
+            envs={"DEEPLX_ENDPOINT": ",".join(s.url for s in servers)},
+            ignore_cache=True,
+        )
+        self.assertEqual(len(translators), len(servers))
+        return BalancedTranslator(translators)
+
+    def test_failover(self):
+        healthy, broken = StubServer(), StubServer(status=500)
+        translator = self.balanced(healthy, broken)
+        texts = [f"text {i}" for i in range(10)]
+        self.assertEqual(
+            [translator.translate(t) for t in texts], [t.upper() for t in texts]
+        )
+        # The broken endpoint is ejected after failure_threshold failures
+        self.assertEqual(broken.requests, BalancedTranslator.failure_threshold)
+        self.assertEqual(healthy.requests, 10)
+        self.assertGreater(translator.endpoints[1].open_until, time.monotonic())
+
+    def test_all_failed(self):
+        translator = self.balanced(StubServer(status=500), StubServer(status=500))
+        with self.assertRaises(Exception):
+            translator.translate("text")
+        self.assertEqual([e.outstanding for e in translator.endpoints], [0, 0])
+
+    def test_least_outstanding(self):
+        fast, slow = StubServer(delay=0.01), StubServer(delay=0.2)
+        translator = self.balanced(fast, slow)
+        texts = [f"text {i}" for i in range(40)]
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(translator.translate, texts))
+        self.assertEqual(results, [t.upper() for t in texts])
+        self.assertGreater(fast.requests, slow.requests * 3)
+
+    def test_async_failover(self):
+        healthy, broken = StubServer(), StubServer(status=500)
+        translator = self.balanced(broken, healthy)
+
+        async def run():
+            return await asyncio.gather(
+                *[translator.atranslate(str(i)) for i in range(20)]
+            )
+
+        self.assertEqual(asyncio.run(run()), [str(i) for i in range(20)])
+        self.assertEqual(healthy.requests, 20)
+
+    def test_half_open(self):
+        healthy, ejected = StubServer(), StubServer(delay=0.2)
+        translator = self.balanced(healthy, ejected)
+        endpoint = translator.endpoints[1]
+        endpoint.failures = BalancedTranslator.failure_threshold
+        endpoint.open_until = time.monotonic() - 1  # cooldown over
+
+        async def run():
+            return await asyncio.gather(
+                *[translator.atranslate(str(i)) for i in range(10)]
+            )
+
+        self.assertEqual(asyncio.run(run()), [str(i) for i in range(10)])
+        # Only one trial request reaches the ejected member, which then recovers
+        self.assertEqual(ejected.requests, 1)
+        self.assertEqual(endpoint.open_until, 0.0)
+
+        # A failed trial keeps the breaker open
+        ejected.status = 500
+        endpoint.failures = BalancedTranslator.failure_threshold
+        endpoint.open_until = time.monotonic() - 1
+        asyncio.run(run())
+        self.assertEqual(ejected.requests, 2)
+        self.assertGreater(endpoint.open_until, time.monotonic())
+        self.assertFalse(endpoint.probing)
+
+
+if __name__ == "__main__":
+    unittest.main()
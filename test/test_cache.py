@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 from pdf2zh import cache
 import threading
@@ -159,6 +161,64 @@ class TestCache(unittest.TestCase):
         cache_instance.set("hello2", "你好2")
         self.assertEqual(cache_instance.get("hello2"), "你好2")
 
+    def test_page_cache(self):
+        """Test page patches round-trip and are separated by params"""
+        page_cache = cache.PageCache({"translate_engine": "test_engine"})
+        self.assertIsNone(page_cache.get("digest"))
+
+        patch = {"page": b"q Q BT /noto 12 Tf ET ", "forms": {"form": b"\xff"}}
+        page_cache.set("digest", patch)
+        self.assertEqual(page_cache.get("digest"), patch)
+
+        other = cache.PageCache({"translate_engine": "other_engine"})
+        self.assertIsNone(other.get("digest"))
+
+    def test_page_cache_eviction(self):
+        """Test only the latest max_entries pages are kept"""
+        page_cache = cache.PageCache({"translate_engine": "test_engine"}, max_entries=2)
+        patch = {"page": b"BT ET ", "forms": {}}
+        for digest in ("first", "second", "third"):
+            page_cache.set(digest, patch)
+        self.assertIsNone(page_cache.get("first"))
+        self.assertEqual(page_cache.get("second"), patch)
+        self.assertEqual(page_cache.get("third"), patch)
+
+    def test_page_checkpoint(self):
+        """Test checkpoint entries survive a restart and a torn last line"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "doc.checkpoint.jsonl")
+            patch = {"page": b"BT ET ", "forms": {}}
+            with cache.PageCheckpoint(path, {"lang_out": "zh"}) as checkpoint:
+                checkpoint.set("digest", patch)
+            with open(path, "a") as f:
+                f.write('{"digest": "torn')
+
+            with cache.PageCheckpoint(path, {"lang_out": "zh"}) as resumed:
+                self.assertEqual(resumed.get("digest"), patch)
+                self.assertIsNone(resumed.get("torn"))
+
+            # Params changed: the old checkpoint must not be reused
+            with cache.PageCheckpoint(path, {"lang_out": "ja"}) as other:
+                self.assertIsNone(other.get("digest"))
+
+    def test_page_checkpoint_locked(self):
+        """Test a second run on the same checkpoint neither reads nor writes it"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "doc.checkpoint.jsonl")
+            patch = {"page": b"BT ET ", "forms": {}}
+            with cache.PageCheckpoint(path, {"lang_out": "zh"}) as first:
+                first.set("first", patch)
+                with cache.PageCheckpoint(path, {"lang_out": "zh"}) as second:
+                    self.assertIsNone(second.get("first"))
+                    second.set("second", patch)
+                cache.remove_checkpoint(path)  # Still in use by the first run
+                self.assertTrue(os.path.exists(path))
+            with cache.PageCheckpoint(path, {"lang_out": "zh"}) as resumed:
+                self.assertEqual(resumed.get("first"), patch)
+                self.assertIsNone(resumed.get("second"))
+            cache.remove_checkpoint(path)
+            self.assertFalse(os.path.exists(path))
+
     # Sometimes the problem of "database is locked" occurs. Temporarily disable this test.
     # def test_thread_safety(self):
     #     """Test thread safety of cache operations"""
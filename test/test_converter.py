@@ -1,8 +1,21 @@
+import asyncio
+import threading
+import time
 import unittest
-from unittest.mock import Mock, patch, MagicMock
+from asyncio import CancelledError
+from unittest.mock import AsyncMock, Mock, patch, MagicMock
 from pdfminer.layout import LTPage, LTChar, LTLine
 from pdfminer.pdfinterp import PDFResourceManager
-from pdf2zh.converter import PDFConverterEx, TranslateConverter
+import numpy as np
+from tenacity import wait_none
+from pdf2zh.converter import (
+    ContentWriter,
+    LayoutParser,
+    PDFConverterEx,
+    TranslateConverter,
+    split_formula,
+)
+from pdf2zh.translator import BaseTranslator
 
 
 class TestPDFConverterEx(unittest.TestCase):
@@ -40,6 +53,21 @@ class TestPDFConverterEx(unittest.TestCase):
         self.assertEqual(result, 120.0)  # Expected text width
 
 
+class SlowTranslator(BaseTranslator):
+    name = "slow"
+
+    def __init__(self):
+        super().__init__("en", "zh", "test", True)
+        self.cancelled = threading.Event()
+
+    async def ado_translate(self, text):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+
+
 class TestTranslateConverter(unittest.TestCase):
     def setUp(self):
         self.rsrcmgr = PDFResourceManager()
@@ -58,6 +86,24 @@ class TestTranslateConverter(unittest.TestCase):
         self.assertEqual(self.converter.translator.lang_in, "en")
         self.assertEqual(self.converter.translator.lang_out, "zh-CN")
 
+    def test_translator_shared(self):
+        converter = TranslateConverter(
+            self.rsrcmgr,
+            layout=self.layout,
+            lang_in="en",
+            lang_out="zh",
+            service="google",
+        )
+        self.assertIs(converter.translator, self.converter.translator)
+        other = TranslateConverter(
+            self.rsrcmgr,
+            layout=self.layout,
+            lang_in="en",
+            lang_out="ja",
+            service="google",
+        )
+        self.assertIsNot(other.translator, self.converter.translator)
+
     @patch("pdf2zh.converter.TranslateConverter.receive_layout")
     def test_receive_layout(self, mock_receive_layout):
         mock_page = LTPage(1, (0, 0, 100, 200))
@@ -95,6 +141,161 @@ class TestTranslateConverter(unittest.TestCase):
         result = self.converter.receive_layout(ltpage)
         self.assertIsNotNone(result)
 
+    def test_glyph_cache(self):
+        tiro = Mock()
+        tiro.to_unichr.side_effect = lambda cid: chr(cid) if cid < 0x80 else ""
+        tiro.char_width.return_value = 0.5
+        noto = Mock()
+        noto.char_lengths.return_value = [1.0]
+        noto.has_glyph.return_value = 0x1234
+        self.converter.fontmap = {"tiro": tiro}
+        self.converter.noto = noto
+        self.converter.noto_name = "noto"
+        self.assertEqual(self.converter.glyph("A"), ("tiro", 0.5, b"41"))
+        self.assertEqual(self.converter.glyph("中"), ("noto", 1.0, b"1234"))
+        self.converter.glyph("A")
+        self.converter.glyph("中")
+        self.assertEqual(tiro.to_unichr.call_count, 2)
+        self.assertEqual(noto.has_glyph.call_count, 1)
+
+    def test_streaming_render_char(self):
+        mock_page = Mock()
+        mock_page.pageno = 1
+        mock_page.cropbox = (0, 0, 100, 200)
+        self.converter.layout = {1: np.ones((200, 100))}
+        self.converter.vchar = "^$"
+        self.converter.begin_page(mock_page, [1, 0, 0, 1, 0, 0])
+        self.assertIsInstance(self.converter.cur_item, LayoutParser)
+        mock_font = Mock()
+        mock_font.fontname = "Times-Roman"
+        mock_font.to_unichr.side_effect = chr
+        mock_font.char_width.return_value = 0.5
+        mock_font.is_vertical.return_value = False
+        mock_font.get_descent.return_value = 0
+        for i, ch in enumerate("Hi"):
+            adv = self.converter.render_char(
+                (1, 0, 0, 1, 10 + i * 6, 100),
+                mock_font,
+                fontsize=12,
+                scaling=1.0,
+                rise=0,
+                cid=ord(ch),
+                ncs=None,
+                graphicstate=None,
+            )
+            self.assertEqual(adv, 6.0)
+        parser = self.converter.cur_item
+        self.assertEqual(parser.sstk, ["Hi"])
+        self.assertEqual(parser.pstk[0].x1, 22.0)
+
+    def test_multiple_services(self):
+        converter = TranslateConverter(
+            self.rsrcmgr,
+            layout=self.layout,
+            lang_in="en",
+            lang_out="zh",
+            service="google,bing",
+        )
+        self.assertEqual(
+            [e.translator.name for e in converter.translator.endpoints],
+            ["google", "bing"],
+        )
+        self.assertEqual(converter.translator.lang_out, "zh-CN")
+
+    def test_cancel_in_flight(self):
+        mock_page = Mock()
+        mock_page.pageno = 1
+        mock_page.cropbox = (0, 0, 100, 200)
+        self.converter.layout = {1: np.ones((200, 100))}
+        self.converter.thread = 1
+        self.converter.translator = SlowTranslator()
+        self.converter.cancellation_event = threading.Event()
+        self.converter.begin_page(mock_page, [1, 0, 0, 1, 0, 0])
+        mock_font = Mock()
+        mock_font.fontname = "Times-Roman"
+        mock_font.to_unichr.side_effect = chr
+        mock_font.char_width.return_value = 0.5
+        mock_font.is_vertical.return_value = False
+        mock_font.get_descent.return_value = 0
+        for i, ch in enumerate("Hi"):
+            self.converter.render_char(
+                (1, 0, 0, 1, 10 + i * 6, 100),
+                mock_font,
+                fontsize=12,
+                scaling=1.0,
+                rise=0,
+                cid=ord(ch),
+                ncs=None,
+                graphicstate=None,
+            )
+        threading.Timer(0.1, self.converter.cancellation_event.set).start()
+        start = time.perf_counter()
+        with self.assertRaises(CancelledError):
+            self.converter.end_page(mock_page)
+        self.assertLess(time.perf_counter() - start, 0.5)
+        # The request itself is cancelled, not left running until its timeout
+        self.assertTrue(self.converter.translator.cancelled.wait(1))
+
+    def render_failure_page(self, texts, translate):
+        mock_page = Mock()
+        mock_page.pageno = 1
+        mock_page.cropbox = (0, 0, 100, 200)
+        # One layout region per text, so that each text is its own paragraph
+        layout = np.ones((200, 100))
+        for i in range(len(texts)):
+            layout[i * 50 : i * 50 + 50] = i + 2
+        self.converter.layout = {1: layout}
+        self.converter.translator = Mock()
+        self.converter.translator.lang_out = "zh"
+        self.converter.thread = 1
+        self.converter.translator.atranslate = AsyncMock(side_effect=translate)
+        self.converter.begin_page(mock_page, [1, 0, 0, 1, 0, 0])
+        mock_font = Mock()
+        mock_font.fontname = "Times-Roman"
+        mock_font.to_unichr.side_effect = chr
+        mock_font.char_width.return_value = 0.5
+        mock_font.is_vertical.return_value = False
+        mock_font.get_descent.return_value = 0
+        self.converter.fontmap = {"Times-Roman": mock_font}
+        self.converter.fontid = {mock_font: "F1"}
+        self.converter.noto = Mock()
+        self.converter.noto.char_lengths.return_value = [0.5]
+        self.converter.noto.has_glyph.side_effect = lambda code: code
+        for row, text in enumerate(texts):
+            for i, ch in enumerate(text):
+                self.converter.render_char(
+                    (1, 0, 0, 1, 10 + i * 6, row * 50 + 20),
+                    mock_font,
+                    fontsize=12,
+                    scaling=1.0,
+                    rise=0,
+                    cid=ord(ch),
+                    ncs=None,
+                    graphicstate=None,
+                )
+        return mock_page
+
+    @patch("pdf2zh.converter.wait_fixed", lambda seconds: wait_none())
+    def test_translation_failure(self):
+        def translate(s):
+            if s == "Hi":
+                raise ValueError("service down")
+            return "你好"
+
+        mock_page = self.render_failure_page(["Hi", "Yo"], translate)
+        # The paragraph keeps its source text once the retries are used up
+        self.converter.end_page(mock_page)
+        self.assertEqual(self.converter.translator.atranslate.call_count, 4)
+        self.assertEqual(self.converter.untranslated, 1)
+
+    @patch("pdf2zh.converter.wait_fixed", lambda seconds: wait_none())
+    def test_translation_failure_whole_page(self):
+        mock_page = self.render_failure_page(["Hi"], ValueError("service down"))
+        with self.assertRaises(ValueError):
+            self.converter.end_page(mock_page)
+        self.assertEqual(self.converter.translator.atranslate.call_count, 3)
+        self.assertEqual(self.converter.untranslated, 0)
+
     def test_invalid_translation_service(self):
         with self.assertRaises(ValueError):
             TranslateConverter(
@@ -106,5 +307,31 @@ class TestTranslateConverter(unittest.TestCase):
             )
 
 
+class TestSplitFormula(unittest.TestCase):
+    def test_split_formula(self):
+        self.assertEqual(split_formula(""), [])
+        self.assertEqual(split_formula("abc"), [("abc", None)])
+        self.assertEqual(
+            split_formula("a {v0} b{ V 1 2 }{v1}c"),
+            [("a ", 0), (" b", 12), ("", 1), ("c", None)],
+        )
+        self.assertEqual(split_formula("{v }x{v1\t2}"), [("", None), ("x", None)])
+
+
+class TestContentWriter(unittest.TestCase):
+    def test_relative_moves(self):
+        writer = ContentWriter()
+        writer.text("tiro", 12.0, 10.5, 100.0, b"4142")
+        writer.text("tiro", 12.0, 20.25, 100.0, b"43")
+        writer.line(0, 50, 10, 0, 0.5)
+        writer.text("noto", 10.0, 10.5, 80.0, b"0001")
+        self.assertEqual(
+            writer.getvalue(),
+            b"BT /tiro 12 Tf 10.5 100 Td [<4142>] TJ 9.75 0 Td [<43>] TJ "
+            b"ET q 1 0 0 1 0 50 cm [] 0 d 0 J 0.5 w 0 0 m 10 0 l S Q BT "
+            b"/noto 10 Tf 10.5 80 Td [<0001>] TJ ET ",
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
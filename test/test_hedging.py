@@ -0,0 +1,97 @@
+import asyncio
+import itertools
+import time
+import unittest
+
+from pdf2zh import cache
+from pdf2zh.hedging import HedgePolicy
+from pdf2zh.limiter import RateLimiter
+from pdf2zh.translator import BaseTranslator
+
+
+class TestHedgePolicy(unittest.TestCase):
+    def setUp(self):
+        self.calls = itertools.count()
+
+    async def translate(self, text):
+        # The first call after warming up hangs, the duplicate is fast
+        if next(self.calls) == 5:
+            await asyncio.sleep(1)
+            return "slow"
+        await asyncio.sleep(0.01)
+        return text
+
+    async def warm_up(self, policy):
+        for i in range(5):
+            self.assertEqual(await policy.acall(self.translate, str(i)), str(i))
+
+    def test_hedge(self):
+        policy = HedgePolicy("test", budget=0.5, min_samples=5)
+
+        async def run():
+            await self.warm_up(policy)
+            return await policy.acall(self.translate, "fast")
+
+        start = time.perf_counter()
+        self.assertEqual(asyncio.run(run()), "fast")
+        self.assertLess(time.perf_counter() - start, 0.5)
+        self.assertEqual(policy.hedges, 1)
+
+    def test_budget(self):
+        policy = HedgePolicy("test", budget=0.1, min_samples=5)
+
+        async def run():
+            await self.warm_up(policy)
+            return await policy.acall(self.translate, "fast")
+
+        # 0.1 × 6 requests leaves no room for a hedge
+        self.assertEqual(asyncio.run(run()), "slow")
+        self.assertEqual(policy.hedges, 0)
+
+    def test_failed_duplicate(self):
+        policy = HedgePolicy("test", budget=1, min_samples=1)
+        policy.latencies.append(0.01)
+        attempts = itertools.count()
+
+        async def translate(text):
+            if next(attempts) == 0:
+                await asyncio.sleep(0.2)
+                return text
+            raise ValueError("duplicate failed")
+
+        self.assertEqual(asyncio.run(policy.acall(translate, "text")), "text")
+
+
+class SleepTranslator(BaseTranslator):
+    name = "sleep"
+
+    async def ado_translate(self, text):
+        await asyncio.sleep(0.05)
+        return text
+
+
+class TestTranslatorHedging(unittest.TestCase):
+    def setUp(self):
+        self.test_db = cache.init_test_db()
+
+    def tearDown(self):
+        cache.clean_test_db(self.test_db)
+
+    def test_limiter_wait_not_sampled(self):
+        translator = SleepTranslator("en", "zh", None, True)
+        translator.limiter = RateLimiter("sleep", concurrency=1)
+        translator.hedger = HedgePolicy("sleep", min_samples=100)
+
+        async def run():
+            return await asyncio.gather(
+                *[translator.atranslate(str(i)) for i in range(10)]
+            )
+
+        self.assertEqual(asyncio.run(run()), [str(i) for i in range(10)])
+        # Requests queue for 0.5s in the limiter, but each one only takes 0.05s
+        self.assertEqual(len(translator.hedger.latencies), 10)
+        self.assertLess(max(translator.hedger.latencies), 0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,231 @@
+import io
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest.mock import patch
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pymupdf import Document, Font, IRect, Pixmap, Rect, csRGB
+from pdf2zh import cache
+from pdf2zh.high_level import inject_fonts, translate, translate_patch
+from pdf2zh.pdfinterp import PDFPageInterpreterEx, page_digest
+from pdf2zh.translator import GoogleTranslator
+
+
+def build(text="Hello world", color=(255, 0, 0), form="Inside form", extra=False):
+    """A page with text, an image and a form XObject, optionally after another page"""
+    src = Document()
+    src.new_page(width=200, height=100).insert_text((10, 50), form)
+    doc = Document()
+    if extra:  # shifts the object ids of the page below
+        doc.new_page().insert_text((72, 72), "Another page")
+    page = doc.new_page()
+    page.insert_text((72, 72), text)
+    pix = Pixmap(csRGB, IRect(0, 0, 4, 4), False)
+    pix.set_rect(pix.irect, color)
+    page.insert_image(Rect(72, 100, 144, 172), pixmap=pix)
+    page.show_pdf_page(Rect(72, 200, 272, 300), src, 0)
+    return doc.tobytes()
+
+
+def digests(data):
+    doc = PDFDocument(PDFParser(io.BytesIO(data)))
+    return [page_digest(page) for page in PDFPage.create_pages(doc)]
+
+
+class TestInjectFonts(unittest.TestCase):
+    def setUp(self):
+        inner = Document()
+        inner.new_page().insert_text((50, 50), "inner", fontname="cour")
+        outer = Document()
+        outer.new_page().show_pdf_page(outer[0].rect, inner, 0)
+        self.doc = Document()
+        for _ in range(3):
+            self.doc.new_page().show_pdf_page(self.doc[0].rect, outer, 0)
+
+    def forms(self):
+        return [
+            xref
+            for xref in range(1, self.doc.xref_length())
+            if self.doc.xref_get_key(xref, "Subtype")[1] == "/Form"
+            and self.doc.xref_get_key(xref, "Resources/Font")[0] != "null"
+        ]
+
+    def test_selected_pages(self):
+        font_id = inject_fonts(self.doc, [("tiro", None)], [1])
+        self.assertEqual(list(font_id), ["tiro"])
+        ref = f"{font_id['tiro']} 0 R"
+        key = "Resources/Font/tiro"
+        self.assertEqual(self.doc.xref_get_key(self.doc[1].xref, key)[1], ref)
+        self.assertEqual(self.doc.xref_get_key(self.doc[0].xref, key)[0], "null")
+        forms = self.forms()
+        self.assertTrue(forms)
+        for xref in forms:
+            self.assertEqual(self.doc.xref_get_key(xref, key)[1], ref)
+
+    def test_pages_out_of_range(self):
+        # e.g. "First 5 pages" on a 3-page document
+        font_id = inject_fonts(self.doc, [("tiro", None)], list(range(5)))
+        for page in self.doc:
+            self.assertIn(font_id["tiro"], [f[0] for f in page.get_fonts()])
+
+    def test_all_pages_share_font(self):
+        font_id = inject_fonts(self.doc, [("tiro", None)])
+        for page in self.doc:
+            self.assertIn(font_id["tiro"], [f[0] for f in page.get_fonts()])
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory(dir=".")
+        self.input = Path(self.tmp.name) / "doc.pdf"
+        self.input.write_bytes(b"%PDF-1.7 v1")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_translate(self, untranslated=0, **kwarg):
+        def fake(stream, mono=None, dual=None, **_):
+            Path(mono).write_bytes(stream)
+            Path(dual).write_bytes(stream)
+            return 1, untranslated
+
+        with patch("pdf2zh.high_level.translate_stream_to", side_effect=fake) as mock:
+            translate([str(self.input)], output=self.tmp.name, **kwarg)
+        return mock.call_count
+
+    def test_skip_up_to_date(self):
+        self.assertEqual(self.run_translate(lang_out="zh", skip_unchanged=True), 1)
+        self.assertEqual(self.run_translate(lang_out="zh", skip_unchanged=True), 0)
+        # Same content, only the modification time changed
+        os.utime(self.input, ns=(0, 0))
+        self.assertEqual(self.run_translate(lang_out="zh", skip_unchanged=True), 0)
+        self.assertEqual(self.run_translate(lang_out="ja", skip_unchanged=True), 1)
+        self.input.write_bytes(b"%PDF-1.7 v2")
+        self.assertEqual(self.run_translate(lang_out="ja", skip_unchanged=True), 1)
+        os.remove(Path(self.tmp.name) / "doc-dual.pdf")
+        self.assertEqual(self.run_translate(lang_out="ja", skip_unchanged=True), 1)
+        self.assertEqual(self.run_translate(lang_out="ja"), 1)
+
+    def test_untranslated_not_recorded(self):
+        # A paragraph kept its source text, so the next run translates again
+        run = self.run_translate(lang_out="zh", skip_unchanged=True, untranslated=1)
+        self.assertEqual(run, 1)
+        self.assertEqual(self.run_translate(lang_out="zh", skip_unchanged=True), 1)
+        self.assertEqual(self.run_translate(lang_out="zh", skip_unchanged=True), 0)
+
+    def test_no_manifest_by_default(self):
+        self.assertEqual(self.run_translate(lang_out="zh"), 1)
+        self.assertEqual(self.run_translate(lang_out="zh"), 1)
+        self.assertFalse(list(Path(self.tmp.name).glob("*.manifest.json")))
+
+    def test_same_stem(self):
+        other = Path(self.tmp.name) / "sub" / "doc.pdf"
+        other.parent.mkdir()
+        other.write_bytes(b"%PDF-1.7 other")
+
+        def fake(stream, mono=None, dual=None, **_):
+            Path(mono).write_bytes(stream)
+            Path(dual).write_bytes(stream)
+            return 1, 0
+
+        with patch("pdf2zh.high_level.translate_stream_to", side_effect=fake):
+            results = translate(
+                [str(self.input), str(other)], output=self.tmp.name, jobs=2
+            )
+        self.assertEqual(len({mono for mono, _ in results}), 2)
+        self.assertEqual(Path(results[1][0]).read_bytes(), b"%PDF-1.7 other")
+
+
+class TestPageDigest(unittest.TestCase):
+    def test_unchanged(self):
+        digest, forms = digests(build())[0]
+        self.assertEqual(digests(build())[0], (digest, forms))
+        # Same page in another document: same digests, other object ids
+        moved, moved_forms = digests(build(extra=True))[1]
+        self.assertEqual(moved, digest)
+        self.assertEqual(moved_forms.keys(), forms.keys())
+        self.assertNotEqual(moved_forms, forms)
+
+    def test_changed(self):
+        digest, forms = digests(build())[0]
+        for changed in ({"text": "Hello there"}, {"color": (0, 0, 255)}):
+            with self.subTest(**changed):
+                other, other_forms = digests(build(**changed))[0]
+                self.assertNotEqual(other, digest)
+                self.assertEqual(other_forms, forms)
+        other, other_forms = digests(build(form="Changed"))[0]
+        self.assertNotEqual(other, digest)
+        self.assertFalse(other_forms.keys() & forms.keys())
+
+
+class Model:
+    def predict(self, image, imgsz=0):
+        return [SimpleNamespace(boxes=[], names={})]
+
+
+async def upper(self, text):
+    return text.upper()
+
+
+@patch.object(GoogleTranslator, "ado_translate", upper)
+class TestPageCache(unittest.TestCase):
+    def setUp(self):
+        self.test_db = cache.init_test_db()
+
+    def tearDown(self):
+        cache.clean_test_db(self.test_db)
+
+    def run_patch(self, data):
+        process_page = PDFPageInterpreterEx.process_page
+        with patch.object(
+            PDFPageInterpreterEx,
+            "process_page",
+            autospec=True,
+            side_effect=process_page,
+        ) as mock:
+            obj_patch, _ = translate_patch(
+                io.BytesIO(data),
+                doc_zh=Document(stream=data),
+                lang_in="en",
+                lang_out="zh",
+                service="google",
+                thread=1,
+                noto_name="noto",
+                noto=Font("tiro"),
+                model=Model(),
+            )
+        return obj_patch, mock.call_count
+
+    def test_splice_unchanged(self):
+        data = build()
+        obj_patch, processed = self.run_patch(data)
+        self.assertEqual(processed, 1)
+        _, forms = digests(data)[0]
+        # The same page after another one: only the new page is typeset
+        moved = build(extra=True)
+        moved_patch, processed = self.run_patch(moved)
+        self.assertEqual(processed, 1)
+        _, moved_forms = digests(moved)[1]
+        for form, objid in forms.items():
+            self.assertIn(objid, obj_patch)
+            # Cached form streams go to the form ids of the new document
+            self.assertEqual(moved_patch[moved_forms[form]], obj_patch[objid])
+
+    def test_changed_page_typeset(self):
+        self.run_patch(build())
+        for changed in (
+            {"text": "Hello there"},
+            {"color": (0, 0, 255)},
+            {"form": "Changed"},
+        ):
+            with self.subTest(**changed):
+                _, processed = self.run_patch(build(**changed))
+                self.assertEqual(processed, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
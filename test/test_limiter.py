@@ -0,0 +1,119 @@
+import asyncio
+import time
+import unittest
+
+import requests
+
+from pdf2zh.limiter import RateLimiter, retry_after
+
+
+def http_error(status, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    return requests.HTTPError(response=response)
+
+
+class TestRetryAfter(unittest.TestCase):
+    def test_status(self):
+        self.assertIsNone(retry_after(ValueError()))
+        self.assertIsNone(retry_after(http_error(500)))
+        self.assertEqual(retry_after(http_error(429)), 0.0)
+        self.assertEqual(retry_after(http_error(429, {"retry-after": "2.5"})), 2.5)
+
+    def test_http_date(self):
+        delay = retry_after(
+            http_error(429, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})
+        )
+        self.assertEqual(delay, 0.0)
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_request_bucket(self):
+        limiter = RateLimiter("test", rpm=60)
+        for _ in range(60):
+            self.assertEqual(limiter.try_acquire(1), 0.0)
+            limiter.release(True)
+        self.assertAlmostEqual(limiter.try_acquire(1), 1.0, delta=0.1)
+
+    def test_token_bucket(self):
+        limiter = RateLimiter("test", tpm=600)
+        self.assertEqual(limiter.try_acquire(500), 0.0)
+        self.assertAlmostEqual(limiter.try_acquire(200), 10.0, delta=0.1)
+
+    def test_aimd(self):
+        limiter = RateLimiter("test", concurrency=8)
+        for _ in range(8):
+            self.assertEqual(limiter.try_acquire(1), 0.0)
+        self.assertGreater(limiter.try_acquire(1), 0)
+        for _ in range(8):
+            limiter.release(False)
+        # A burst of 429s only halves the limit once
+        limiter.throttle(0.01)
+        limiter.throttle(0.01)
+        self.assertEqual(limiter.limit, 4)
+        time.sleep(0.02)
+        for _ in range(4):
+            self.assertEqual(limiter.try_acquire(1), 0.0)
+        self.assertGreater(limiter.try_acquire(1), 0)
+        limiter.release(True)
+        self.assertEqual(limiter.limit, 4.25)
+
+    def test_acall_retries_rate_limited(self):
+        limiter = RateLimiter("test")
+        errors = [http_error(429, {"Retry-After": "0.1"})]
+
+        async def translate(text):
+            if errors:
+                raise errors.pop()
+            return text.upper()
+
+        start = time.perf_counter()
+        self.assertEqual(asyncio.run(limiter.acall(translate, "hello")), "HELLO")
+        self.assertGreaterEqual(time.perf_counter() - start, 0.1)
+        self.assertEqual(limiter.inflight, 0)
+
+        async def parse(text):
+            return int(text)
+
+        with self.assertRaises(ValueError):
+            asyncio.run(limiter.acall(parse, "hello"))
+        self.assertEqual(limiter.inflight, 0)
+
+    def test_acall_cancelled(self):
+        limiter = RateLimiter("test", concurrency=1)
+
+        async def translate(text):
+            await asyncio.sleep(10)
+
+        async def run():
+            task = asyncio.ensure_future(limiter.acall(translate, "hello"))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        self.assertEqual(limiter.inflight, 0)
+
+    def test_acall_concurrency(self):
+        limiter = RateLimiter("test", concurrency=2)
+        peak = 0
+
+        async def translate(text):
+            nonlocal peak
+            peak = max(peak, limiter.inflight)
+            await asyncio.sleep(0.01)
+            return text
+
+        async def run():
+            return await asyncio.gather(
+                *[limiter.acall(translate, str(i)) for i in range(10)]
+            )
+
+        self.assertEqual(asyncio.run(run()), [str(i) for i in range(10)])
+        self.assertEqual(peak, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
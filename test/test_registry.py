@@ -0,0 +1,81 @@
+import os
+import unittest
+from string import Template
+from unittest.mock import patch
+
+from pdf2zh import registry
+from pdf2zh.config import ConfigManager
+
+from pdf2zh.registry import get_translator, get_translator_class, translators
+from pdf2zh.translator import BingTranslator, GoogleTranslator
+
+
+class TestRegistry(unittest.TestCase):
+    def test_translator_class(self):
+        self.assertIs(get_translator_class("google"), GoogleTranslator)
+        self.assertIs(get_translator_class("bing"), BingTranslator)
+        self.assertEqual(len(translators), 23)
+        with self.assertRaises(ValueError):
+            get_translator_class("unknown")
+        with self.assertRaises(ValueError):
+            get_translator("unknown", "en", "zh")
+
+    def test_pooled(self):
+        translator = get_translator("google", "en", "zh")
+        self.assertIs(get_translator("google", "en", "zh"), translator)
+        self.assertIsNot(get_translator("google", "en", "ja"), translator)
+        self.assertIsNot(
+            get_translator("google", "en", "zh", ignore_cache=True), translator
+        )
+        self.assertIsNot(
+            get_translator("google", "en", "zh", prompt=Template("$text")), translator
+        )
+
+    def test_envs(self):
+        first = get_translator(
+            "deeplx", "en", "zh", envs={"DEEPLX_ENDPOINT": "http://127.0.0.1:1"}
+        )
+        second = get_translator(
+            "deeplx", "en", "zh", envs={"DEEPLX_ENDPOINT": "http://127.0.0.1:2"}
+        )
+        self.assertIsNot(first, second)
+        self.assertEqual(second.envs["DEEPLX_ENDPOINT"], "http://127.0.0.1:2")
+
+    def test_shared_members(self):
+        # A service keeps one instance whether used alone or balanced with others
+        balanced = get_translator("google,bing", "en", "zh")
+        self.assertIs(
+            balanced.endpoints[0].translator, get_translator("google", "en", "zh")
+        )
+        self.assertIs(
+            balanced.endpoints[1].translator, get_translator("bing", "en", "zh")
+        )
+
+    def test_environment_change(self):
+        ConfigManager.clear()
+        with patch.dict(os.environ, {"DEEPLX_ACCESS_TOKEN": "first"}):
+            first = get_translator("deeplx", "en", "zh")
+            self.assertIs(get_translator("deeplx", "en", "zh"), first)
+        with patch.dict(os.environ, {"DEEPLX_ACCESS_TOKEN": "second"}):
+            second = get_translator("deeplx", "en", "zh")
+        self.assertIsNot(second, first)
+        self.assertEqual(second.envs["DEEPLX_ACCESS_TOKEN"], "second")
+
+    @patch.object(registry, "POOL_SIZE", 2)
+    def test_lru(self):
+        first = get_translator("google", "en", "fr")
+        get_translator("google", "en", "de")
+        self.assertIs(get_translator("google", "en", "fr"), first)
+        get_translator("google", "en", "it")
+        self.assertLessEqual(len(registry.translator_pool), 2)
+        self.assertLessEqual(len(registry.endpoint_pool), 2)
+        # The least recently used one was dropped, the others are kept
+        self.assertIs(get_translator("google", "en", "fr"), first)
+        self.assertNotIn(
+            registry.pool_key("google", "en", "de", {}, None, False),
+            registry.translator_pool,
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
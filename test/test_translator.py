@@ -1,4 +1,12 @@
+import asyncio
+import json
+import subprocess
+import sys
+import threading
+import time
 import unittest
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from textwrap import dedent
 from unittest import mock
 
@@ -6,7 +14,18 @@ from ollama import ResponseError as OllamaResponseError
 
 from pdf2zh import cache
 from pdf2zh.config import ConfigManager
-from pdf2zh.translator import BaseTranslator, OllamaTranslator, OpenAIlikedTranslator
+from pdf2zh.translator import (
+    BaseTranslator,
+    BingTranslator,
+    DeepLXTranslator,
+    DifyTranslator,
+    LazyModule,
+    OllamaTranslator,
+    OpenAIlikedTranslator,
+    close_async_http_clients,
+    run_async,
+    split_text,
+)
 
 # Since it is necessary to test whether the functionality meets the expected requirements,
 # private functions and private methods are allowed to be called.
@@ -49,6 +68,14 @@ class TestTranslator(unittest.TestCase):
         no_cache_result = translator.translate(text)
         self.assertNotEqual(first_result, no_cache_result)
 
+    def test_atranslate_cache(self):
+        translator = AutoIncreaseTranslator("en", "zh", "test", False)
+        first_result = asyncio.run(translator.atranslate("Hello World"))
+        self.assertEqual(translator.translate("Hello World"), first_result)
+        self.assertEqual(
+            asyncio.run(translator.atranslate("Hello World")), first_result
+        )
+
     def test_add_cache_impact_parameters(self):
         translator = AutoIncreaseTranslator("en", "zh", "test", False)
 
@@ -83,6 +110,58 @@ class TestTranslator(unittest.TestCase):
             translator.translate("Hello World")
 
 
+class ChunkTranslator(BaseTranslator):
+    name = "chunk"
+    chunk_size = 30
+
+    def __init__(self):
+        super().__init__("en", "zh", "test", True)
+        self.requests = []
+
+    def do_translate(self, text):
+        self.requests.append(text)
+        return text.upper()
+
+
+class TestChunking(unittest.TestCase):
+    def setUp(self):
+        self.test_db = cache.init_test_db()
+
+    def tearDown(self):
+        cache.clean_test_db(self.test_db)
+
+    def test_split_text(self):
+        text = "First sentence, pi is 3.14. Second one {v12} here. Third!"
+        chunks = split_text(text, 30)
+        self.assertEqual("".join(chunks), text)
+        self.assertEqual(
+            chunks, ["First sentence, pi is 3.14. ", "Second one {v12} here. Third!"]
+        )
+        self.assertEqual(split_text(text, 100), [text])
+
+    def test_split_placeholder(self):
+        text = "公式{v1}和公式{ v 23 }" * 10
+        chunks = split_text(text, 13)
+        self.assertEqual("".join(chunks), text)
+        for chunk in chunks:
+            self.assertLessEqual(len(chunk), 13)
+            self.assertEqual(chunk.count("{"), chunk.count("}"))
+        # Placeholders longer than the chunk size are kept whole
+        self.assertEqual(split_text("ab{v123456}cd", 4), ["ab", "{v123456}", "cd"])
+
+    def test_split_cjk(self):
+        text = "第一句话。第二句话！第三句话？"
+        self.assertEqual(split_text(text, 10), ["第一句话。第二句话！", "第三句话？"])
+
+    def test_translate_chunks(self):
+        translator = ChunkTranslator()
+        text = "One sentence here. Another sentence {v0} there.\n" * 3
+        self.assertEqual(translator.translate(text), text.upper())
+        self.assertEqual(len(translator.requests), 6)
+        self.assertTrue(all(len(r) <= 30 for r in translator.requests))
+        self.assertEqual(asyncio.run(translator.atranslate(text)), text.upper())
+
+
 class TestOpenAIlikedTranslator(unittest.TestCase):
     def setUp(self) -> None:
         self.default_envs = {
@@ -155,7 +234,9 @@ class TestOpenAIlikedTranslator(unittest.TestCase):
 class TestOllamaTranslator(unittest.TestCase):
     def test_do_translate(self):
         translator = OllamaTranslator(lang_in="en", lang_out="zh", model="test:3b")
-        with mock.patch.object(translator, "client") as mock_client:
+        with mock.patch.object(
+            translator, "client", new_callable=mock.AsyncMock
+        ) as mock_client:
             chat_response = mock_client.chat.return_value
             chat_response.message.content = dedent(
                 """\
@@ -169,7 +250,7 @@ class TestOllamaTranslator(unittest.TestCase):
 
             text = "The sky appears blue because of..."
             translated_result = translator.do_translate(text)
-            mock_client.chat.assert_called_once_with(
+            mock_client.chat.assert_awaited_once_with(
                 model="test:3b",
                 messages=translator.prompt(text, prompt_template=None),
                 options={
@@ -182,7 +263,7 @@ class TestOllamaTranslator(unittest.TestCase):
             # response error
             mock_client.chat.side_effect = OllamaResponseError("an error status")
             with self.assertRaises(OllamaResponseError):
-                mock_client.chat()
+                translator.do_translate(text)
 
     def test_remove_cot_content(self):
         fake_cot_resp_text = dedent(
@@ -224,5 +305,216 @@ class TestOllamaTranslator(unittest.TestCase):
         )
 
 
+class SlowDeepLXHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(0.2)
+        data = json.dumps({"data": body["text"].upper()}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 512
+
+
+class TestAsyncTranslator(unittest.TestCase):
+    def setUp(self):
+        self.test_db = cache.init_test_db()
+        self.server = StubServer(("127.0.0.1", 0), SlowDeepLXHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        cache.clean_test_db(self.test_db)
+
+    def test_concurrent_requests(self):
+        translator = DeepLXTranslator(
+            "en",
+            "zh",
+            None,
+            envs={"DEEPLX_ENDPOINT": f"http://127.0.0.1:{self.server.server_port}"},
+            ignore_cache=True,
+        )
+        texts = [f"text {i}" for i in range(200)]
+
+        async def run():
+            return await asyncio.gather(*[translator.atranslate(t) for t in texts])
+
+        start = time.perf_counter()
+        results = asyncio.run(run())
+        # 200 requests of 0.2s each, far less than sequential 40s
+        self.assertLess(time.perf_counter() - start, 10)
+        self.assertEqual(results, [t.upper() for t in texts])
+
+    def test_sync_wrapper(self):
+        translator = DeepLXTranslator(
+            "en",
+            "zh",
+            None,
+            envs={"DEEPLX_ENDPOINT": f"http://127.0.0.1:{self.server.server_port}"},
+            ignore_cache=True,
+        )
+        texts = [f"text {i}" for i in range(20)]
+        # translate() runs atranslate on the shared event loop
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            results = list(executor.map(translator.translate, texts))
+        self.assertEqual(results, [t.upper() for t in texts])
+        client = translator.client
+        run_async(close_async_http_clients())
+        self.assertTrue(client.is_closed)
+
+
+class KeepAliveDifyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.connections += 1
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(0.2)
+        data = json.dumps({"answer": body["inputs"]["text"].upper()}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestConnectionPool(unittest.TestCase):
+    def setUp(self):
+        self.test_db = cache.init_test_db()
+        self.server = StubServer(("127.0.0.1", 0), KeepAliveDifyHandler)
+        self.server.connections = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        cache.clean_test_db(self.test_db)
+
+    def test_connection_reuse(self):
+        envs = {
+            "DIFY_API_URL": f"http://127.0.0.1:{self.server.server_port}",
+            "DIFY_API_KEY": "key",
+        }
+        translators = [
+            DifyTranslator("en", "zh", None, envs=envs, ignore_cache=True),
+            DifyTranslator("en", "ja", None, envs=envs, ignore_cache=True),
+        ]
+        # One thread pool per page, as in TranslateConverter
+        for translator in translators * 3:
+            with ThreadPoolExecutor(max_workers=20) as executor:
+                list(executor.map(translator.do_translate, map(str, range(20))))
+        # The sessions share one pool that keeps up to 100 idle connections per
+        # host, so the 20 connections opened for the first page serve all others.
+        # Separate default sessions would keep only 10 each and reconnect.
+        self.assertLessEqual(self.server.connections, 20)
+
+
+class StubBingHandler(BaseHTTPRequestHandler):
+    token = "token0"
+    pages = 0
+
+    def do_GET(self):
+        type(self).pages += 1
+        self.reply(
+            "text/html",
+            '<div data-iid="translator.5023"></div><script>"ig":"IG0",'
+            f'params_AbusePreventionHelper = [1,"{self.token}",3600000];</script>',
+        )
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        form = dict(p.split("=") for p in self.rfile.read(length).decode().split("&"))
+        if form["token"] != self.token:
+            self.reply("application/json", json.dumps({"statusCode": 205}))
+        else:
+            result = [{"translations": [{"text": form["text"].upper()}]}]
+            self.reply("application/json", json.dumps(result))
+
+    def reply(self, content_type, body):
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestBingTranslator(unittest.TestCase):
+    def setUp(self):
+        self.server = StubServer(("127.0.0.1", 0), StubBingHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.translator = BingTranslator("en", "zh", None, ignore_cache=True)
+        self.translator.endpoint = (
+            f"http://127.0.0.1:{self.server.server_port}/translator"
+        )
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_sid_reuse(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            texts = [f"text{i}" for i in range(20)]
+            results = list(executor.map(self.translator.do_translate, texts))
+        self.assertEqual(results, [t.upper() for t in texts])
+        self.assertEqual(StubBingHandler.pages, 1)
+
+        # The token is rotated: refresh once and retry
+        StubBingHandler.token = "token1"
+        self.assertEqual(self.translator.do_translate("again"), "AGAIN")
+        self.assertEqual(asyncio.run(self.translator.atranslate("async")), "ASYNC")
+        self.assertEqual(StubBingHandler.pages, 2)
+
+
+class TestImportTime(unittest.TestCase):
+    # Translator SDKs are imported only when their service is selected
+    sdk_modules = ("deepl", "ollama", "openai", "xinference_client", "tencentcloud")
+    budget = 0.5  # seconds, pdf2zh.translator alone used to take over 1s
+
+    def test_import_time(self):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import pdf2zh"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        cumulative = {}
+        for line in result.stderr.splitlines():
+            if line.startswith("import time:") and "|" in line:
+                _, total, module = line.split("|")
+                if total.strip().isdigit():
+                    cumulative[module.strip()] = int(total) / 1e6
+        self.assertIn("pdf2zh.translator", cumulative)
+        for module in self.sdk_modules:
+            self.assertNotIn(module, cumulative)
+        self.assertNotIn("azure.ai.translation.text", cumulative)
+        self.assertLess(cumulative["pdf2zh.translator"], self.budget)
+
+    def test_lazy_module(self):
+        module = LazyModule("json")
+        self.assertIsNone(module._module)
+        self.assertIs(module.dumps, json.dumps)
+        self.assertIs(module._module, json)
+
+
 if __name__ == "__main__":
     unittest.main()